@@ -0,0 +1,346 @@
+"""Scheduled alerting over the forecasts and air quality of a watchlist of cities.
+
+Each cycle pulls data through the shared fetchers in smartcity.py, packs it into
+(metric × city × time-slot) NumPy arrays and evaluates every rule as whole-array
+operations, so evaluation stays in the millisecond range for hundreds of cities.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import threading
+import time
+from uuid import uuid4
+
+import numpy as np
+
+from smartcity import (
+    decode_value,
+    encode_value,
+    get_air_pollution_data,
+    get_kv_store,
+    get_secret,
+    get_weather_data,
+    get_weekly_forecast,
+    paced_calls,
+)
+
+ALERT_INTERVAL = 15 * 60  # seconds between scheduled cycles
+FORECAST_SLOTS = 40  # 5 days × 8 three-hour slots, as requested by get_weekly_forecast
+KEY_PREFIX = "alerts:"  # shared keys: watchlist, due, running, cursor, feed, active, stats, last_good, last_aqi
+
+FORECAST_METRICS = {
+    "temp": lambda e: e["main"]["temp"],
+    "temp_min": lambda e: e["main"]["temp_min"],
+    "temp_max": lambda e: e["main"]["temp_max"],
+    "humidity": lambda e: e["main"]["humidity"],
+    "pressure": lambda e: e["main"]["pressure"],
+    "wind": lambda e: e["wind"]["speed"],
+    "rain": lambda e: e.get("rain", {}).get("3h", 0.0),
+}
+
+# Air quality has two slots per city: the previous cycle's reading and the current one
+AQI_METRICS = {
+    "aqi": lambda e: e["main"]["aqi"],
+    "pm2_5": lambda e: e["components"]["pm2_5"],
+    "no2": lambda e: e["components"]["no2"],
+}
+
+# kind: above/below compare each slot with the threshold; rise/fall compare the
+# change over `window` slots (3 h each for forecasts, one cycle for air quality)
+FORECAST_RULES = [
+    {"name": "Heatwave", "metric": "temp_max", "kind": "above", "threshold": 35.0, "unit": "°C", "severity": "warning"},
+    {"name": "Freezing", "metric": "temp_min", "kind": "below", "threshold": 0.0, "unit": "°C", "severity": "warning"},
+    {"name": "High wind", "metric": "wind", "kind": "above", "threshold": 15.0, "unit": " m/s", "severity": "warning"},
+    {"name": "Heavy rain", "metric": "rain", "kind": "above", "threshold": 10.0, "unit": " mm/3h", "severity": "warning"},
+    {"name": "Rapid warming", "metric": "temp", "kind": "rise", "threshold": 10.0, "window": 8, "unit": "°C", "severity": "info"},
+    {"name": "Pressure drop", "metric": "pressure", "kind": "fall", "threshold": 10.0, "window": 4, "unit": " hPa", "severity": "warning"},
+]
+
+AQI_RULES = [
+    {"name": "Poor air quality", "metric": "aqi", "kind": "above", "threshold": 3, "unit": "", "severity": "warning"},
+    {"name": "PM2.5 spike", "metric": "pm2_5", "kind": "rise", "threshold": 25.0, "window": 1, "unit": " μg/m³", "severity": "warning"},
+    {"name": "NO₂ spike", "metric": "no2", "kind": "rise", "threshold": 40.0, "window": 1, "unit": " μg/m³", "severity": "info"},
+]
+
+_SIGN = {"above": 1.0, "below": -1.0, "rise": 1.0, "fall": -1.0}
+
+# ========================================
+# 🧮 VECTORIZED RULE EVALUATION
+# ========================================
+
+def evaluate_rules(values, metrics, rules, current_only=False):
+    """Evaluate rules over a (metric × city × slot) array; NaN never triggers.
+
+    Returns (rule, city_index, slot_index, value) for the first triggering slot of
+    every rule/city pair. For rise/fall rules the value is the change and the slot
+    is the one where the change completes. With current_only, above/below rules only
+    look at the last slot (air quality keeps the previous reading in slot 0 just for
+    rise/fall rules).
+    """
+    metric_index = {name: i for i, name in enumerate(metrics)}
+    triggered = []
+
+    def collect(group, hits, observed, offset):
+        fired = hits.any(axis=2)
+        first = hits.argmax(axis=2)
+        for r, c in zip(*np.nonzero(fired)):
+            s = first[r, c]
+            triggered.append((group[r], int(c), int(s) + offset, float(observed[r, c, s])))
+
+    level = [rule for rule in rules if rule["kind"] in ("above", "below")]
+    if level:
+        idx = [metric_index[rule["metric"]] for rule in level]
+        sign = np.array([_SIGN[rule["kind"]] for rule in level])[:, None, None]
+        threshold = np.array([rule["threshold"] for rule in level], dtype=float)[:, None, None]
+        first_slot = values.shape[2] - 1 if current_only else 0
+        observed = values[idx, :, first_slot:]
+        collect(level, observed * sign > threshold * sign, observed, first_slot)
+
+    rate = [rule for rule in rules if rule["kind"] in ("rise", "fall")]
+    for window in sorted({rule.get("window", 1) for rule in rate}):
+        if values.shape[2] <= window:
+            continue
+        group = [rule for rule in rate if rule.get("window", 1) == window]
+        idx = [metric_index[rule["metric"]] for rule in group]
+        sign = np.array([_SIGN[rule["kind"]] for rule in group])[:, None, None]
+        threshold = np.array([rule["threshold"] for rule in group], dtype=float)[:, None, None]
+        change = values[idx, :, window:] - values[idx, :, :-window]
+        collect(group, change * sign > threshold, change, window)
+
+    return triggered
+
+
+def format_alert(rule, value):
+    if rule["kind"] in ("rise", "fall"):
+        return f"{rule['name']}: {rule['metric']} {value:+.1f}{rule['unit']} (threshold {rule['threshold']}{rule['unit']})"
+    return f"{rule['name']}: {rule['metric']} {value:.1f}{rule['unit']} (threshold {rule['threshold']}{rule['unit']})"
+
+# ========================================
+# ⏰ ALERT ENGINE & SCHEDULER
+# ========================================
+
+class AlertEngine:
+    """Watchlist, scheduler and alert feed shared by every process using the same store.
+
+    Each process runs a scheduler thread, but a cycle only starts for whichever process
+    claims the `due` key for the interval, and the `running` lease keeps manual and
+    scheduled cycles from overlapping. The feed, active events, previous air-quality
+    readings and last good forecasts all live in get_kv_store(), so every replica
+    shows the same alerts.
+
+    Upstream calls go through paced_calls: they take at most the background share of
+    the per-minute budget, waiting for it rather than failing, and a cycle stops
+    fetching at 90% of the interval. Cities that did not fit are fetched first in the
+    next cycle and are evaluated from their last good forecast in the meantime.
+    """
+
+    def __init__(self, interval=ALERT_INTERVAL, max_workers=4, feed_size=500, poll=60):
+        self.interval = interval
+        self.feed_size = feed_size
+        self.poll = min(poll, interval)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alerts")
+        self._lock = threading.Lock()
+        self._coords = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    # --- shared state ----------------------------------------------------
+
+    def _load(self, name, default):
+        blob = get_kv_store().get(KEY_PREFIX + name)
+        return decode_value(blob) if blob is not None else default
+
+    def _save(self, name, value, ttl=None):
+        get_kv_store().set(KEY_PREFIX + name, encode_value(value), ttl)
+
+    # --- watchlist -------------------------------------------------------
+
+    def get_watchlist(self):
+        return self._load("watchlist", [])
+
+    def set_watchlist(self, cities):
+        cities = list(dict.fromkeys(c.strip() for c in cities if c.strip()))
+        self._save("watchlist", cities)
+        return cities
+
+    # --- scheduler -------------------------------------------------------
+
+    def start(self):
+        """Start this process's scheduler thread once; later calls are no-ops"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="alert-scheduler", daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """Make the next cycle due now, for whichever process polls first"""
+        get_kv_store().delete(KEY_PREFIX + "due")
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            try:
+                if get_kv_store().add(KEY_PREFIX + "due", b"1", self.interval):
+                    if self.run_cycle() is None:
+                        # Another process is mid-cycle; try again on the next poll
+                        get_kv_store().delete(KEY_PREFIX + "due")
+            except Exception as e:
+                self._save("last_error", str(e))
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    # --- one cycle -------------------------------------------------------
+
+    def _pull(self, city, weather_api_key, deadline):
+        with paced_calls(deadline):
+            coords = self._coords.get(city)
+            if coords is None:
+                current = get_weather_data(city, weather_api_key)
+                if "error" in current:
+                    return None, None
+                coords = self._coords[city] = (current["coord"]["lat"], current["coord"]["lon"])
+            forecast = get_weekly_forecast(weather_api_key, *coords)
+            air = get_air_pollution_data(*coords, weather_api_key)
+        return (None if "error" in forecast else forecast), (None if "error" in air else air)
+
+    def run_cycle(self, cities=None):
+        """Pull, evaluate and publish. Returns the new alerts, or None if another cycle holds the lease."""
+        weather_api_key = get_secret("OPENWEATHER_APIKEY")
+        watchlist = self.get_watchlist()
+        ad_hoc = cities is not None
+        cities = watchlist if cities is None else cities
+        if not weather_api_key or not cities:
+            return []
+
+        store = get_kv_store()
+        token = uuid4().hex.encode()
+        if not store.add(KEY_PREFIX + "running", token, self.interval):
+            return None
+        try:
+            return self._cycle(cities, weather_api_key, watchlist, ad_hoc)
+        finally:
+            if store.get(KEY_PREFIX + "running") == token:
+                store.delete(KEY_PREFIX + "running")
+
+    def _cycle(self, cities, weather_api_key, watchlist, ad_hoc):
+        started = time.perf_counter()
+        deadline = time.time() + self.interval * 0.9
+
+        # Rotate so watchlist cities that missed the previous deadline are fetched first;
+        # ad-hoc city lists neither use nor move the watchlist's cursor
+        cursor = 0 if ad_hoc else self._load("cursor", 0) % len(cities)
+        order = cities[cursor:] + cities[:cursor]
+        pulled = dict(zip(order, self._executor.map(lambda c: self._pull(c, weather_api_key, deadline), order)))
+        missed = [c for c in order if pulled[c][0] is None]
+        if not ad_hoc:
+            self._save("cursor", (cursor + order.index(missed[0])) % len(cities) if missed else 0)
+        fetched = time.perf_counter()
+
+        last_good = self._load("last_good", {})
+        last_aqi = self._load("last_aqi", {})
+
+        forecast_values = np.full((len(FORECAST_METRICS), len(cities), FORECAST_SLOTS), np.nan)
+        forecast_times = np.zeros((len(cities), FORECAST_SLOTS), dtype=np.int64)
+        aqi_values = np.full((len(AQI_METRICS), len(cities), 2), np.nan)
+        aqi_times = np.zeros((len(cities), 2), dtype=np.int64)
+
+        # Rule names each city had fresh data for; only these rule/city pairs can clear
+        fresh = {}
+        for c, city in enumerate(cities):
+            forecast, air = pulled[city]
+            if forecast is not None:
+                entries = forecast["list"][:FORECAST_SLOTS]
+                rows = [[extract(entry) for entry in entries] for extract in FORECAST_METRICS.values()]
+                last_good[city] = {"values": rows, "times": [entry["dt"] for entry in entries]}
+            if city in last_good:
+                rows, times = last_good[city]["values"], last_good[city]["times"]
+                forecast_values[:, c, :len(times)] = rows
+                forecast_times[c, :len(times)] = times
+                fresh[city] = [rule["name"] for rule in FORECAST_RULES]
+            if city in last_aqi:
+                aqi_values[:, c, 0], aqi_times[c, 0] = last_aqi[city]
+            if air is not None:
+                entry = air["list"][0]
+                current = [extract(entry) for extract in AQI_METRICS.values()]
+                aqi_values[:, c, 1], aqi_times[c, 1] = current, entry["dt"]
+                last_aqi[city] = [current, entry["dt"]]
+                fresh.setdefault(city, []).extend(rule["name"] for rule in AQI_RULES)
+        # Other watchlist cities keep their state; only cities that left the watchlist are dropped
+        watched = set(watchlist)
+        self._save("last_good", {city: v for city, v in last_good.items() if city in watched})
+        self._save("last_aqi", {city: v for city, v in last_aqi.items() if city in watched})
+        packed = time.perf_counter()
+
+        triggered = [
+            (rule, c, forecast_times[c, s], value)
+            for rule, c, s, value in evaluate_rules(forecast_values, list(FORECAST_METRICS), FORECAST_RULES)
+        ] + [
+            (rule, c, aqi_times[c, s], value)
+            for rule, c, s, value in evaluate_rules(aqi_values, list(AQI_METRICS), AQI_RULES, current_only=True)
+        ]
+        evaluated = time.perf_counter()
+
+        new_alerts = self._publish(cities, triggered, fresh, watched)
+        self._save("stats", {
+            "last_cycle": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "cities": len(cities),
+            "cities_fetched": len(cities) - len(missed),
+            "cities_with_data": sum(city in last_good for city in cities),
+            "fetch_ms": round((fetched - started) * 1000, 1),
+            "pack_ms": round((packed - fetched) * 1000, 1),
+            "evaluation_ms": round((evaluated - packed) * 1000, 3),
+            "triggered": len(triggered),
+            "new_alerts": len(new_alerts),
+        })
+        return new_alerts
+
+    def _publish(self, cities, triggered, fresh, watched):
+        """Post one alert per event: a rule/city pair that starts firing stays quiet until it clears.
+
+        A pair clears only when its city had fresh data for that rule and it no longer
+        fires, so a missed fetch or an ad-hoc city list never re-arms other events.
+        """
+        active = {tuple(pair) for pair in self._load("active", [])}
+        firing = set()
+        new_alerts = []
+        for rule, c, slot_time, value in triggered:
+            pair = (cities[c], rule["name"])
+            firing.add(pair)
+            if pair in active:
+                continue
+            new_alerts.append({
+                "city": cities[c],
+                "rule": rule["name"],
+                "severity": rule["severity"],
+                "message": format_alert(rule, value),
+                "at": datetime.fromtimestamp(int(slot_time)).strftime("%a %d %b %H:%M") if slot_time else "now",
+                "published": datetime.now().strftime("%H:%M:%S"),
+            })
+        cleared = {(city, name) for city, names in fresh.items() for name in names} - firing
+        active = {pair for pair in (active | firing) - cleared if pair[0] in watched}
+        self._save("active", [list(pair) for pair in sorted(active)])
+        feed = self._load("feed", [])
+        self._save("feed", (new_alerts[::-1] + feed)[:self.feed_size])
+        return new_alerts
+
+    # --- feed ------------------------------------------------------------
+
+    def feed(self, limit=100):
+        return self._load("feed", [])[:limit]
+
+    def snapshot(self):
+        with self._lock:
+            running = self._thread is not None and self._thread.is_alive()
+        return {
+            "scheduler_running (this process)": running,
+            "cycle_in_progress": get_kv_store().get(KEY_PREFIX + "running") is not None,
+            "interval_s": self.interval,
+            "last_error": self._load("last_error", None),
+            **self._load("stats", {}),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_alert_engine():
+    return AlertEngine()
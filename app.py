@@ -1,102 +1,306 @@
 import streamlit as st
-from langchain_ibm import WatsonxLLM
-from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
 from datetime import datetime
-from fpdf import FPDF
-import requests
 import pandas as pd
 import altair as alt
-from functools import lru_cache
+from collections import Counter, OrderedDict, deque
+from uuid import uuid4
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+from smartcity import (
+    decode_value,
+    downsample_series,
+    encode_value,
+    export_city_report,
+    get_air_pollution_data,
+    get_city_summary,
+    get_kv_store,
+    get_llm,
+    get_openweather_quota,
+    get_secret,
+    get_weather_data,
+    get_weekly_forecast,
+)
+from alerts import get_alert_engine
+from prefetch import Prefetcher
 
 # ========================================
-# 🔧 WEATHER API FUNCTIONS (FIXED)
+# 🗄️ SHARED SESSION STORE
 # ========================================
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes to respect rate limits
-def get_weather_data(city: str, weather_api_key: str):
-    """Fetch current weather data from OpenWeatherMap"""
-    base_url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": city,
-        "appid": weather_api_key,
-        "units": "metric"  # Returns temperature in Celsius directly
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, timeout=10)
-        data = response.json()
-        
-        # Handle OpenWeather-specific error codes
-        if response.status_code == 401:
-            return {"error": "❌ Invalid API key. Verify in OpenWeather dashboard."}
-        elif response.status_code == 404:
-            return {"error": f"❌ City '{city}' not found. Try 'City,Country' format."}
-        elif response.status_code == 429:
-            return {"error": "⚠️ Rate limit exceeded. Wait 60 seconds before retrying."}
-        elif data.get("cod") != 200:
-            return {"error": f"❌ API Error {data.get('cod')}: {data.get('message', 'Unknown')}"}
-        
-        return data
-    except requests.exceptions.RequestException as e:
-        return {"error": f"🌐 Network error: {str(e)}"}
-    except Exception as e:
-        return {"error": f"💥 Unexpected error: {str(e)}"}
-
-
-@st.cache_data(ttl=300)
-def get_weekly_forecast(weather_api_key: str, lat: float, lon: float):
-    """Fetch 5-day/3-hour forecast from OpenWeatherMap"""
-    base_url = "https://api.openweathermap.org/data/2.5/forecast"
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": weather_api_key,
-        "units": "metric",
-        "cnt": 40  # 5 days × 8 intervals/day
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, timeout=15)
-        data = response.json()
-        
-        if response.status_code == 401:
-            return {"error": "❌ Invalid API key for forecast endpoint."}
-        elif data.get("cod") != "200":
-            return {"error": f"❌ Forecast Error: {data.get('message', 'Unknown')}"}
-        
-        return data
-    except Exception as e:
-        return {"error": f"💥 Forecast fetch error: {str(e)}"}
+PERSISTED_SESSION_KEYS = ("profile_complete", "profile_data", "current_section", "messages", "city_data", "language")
+SESSION_TTL = 24 * 3600
 
 
-@st.cache_data(ttl=300)
-def get_air_pollution_data(lat: float, lon: float, weather_api_key: str):
-    """Fetch air pollution data from OpenWeatherMap"""
-    url = "https://api.openweathermap.org/data/2.5/air_pollution"
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": weather_api_key
-    }
-    
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if response.status_code == 401:
-            return {"error": "❌ Invalid API key for air pollution endpoint."}
-        elif data.get("cod") != "200":
-            return {"error": f"❌ Air Quality Error: {data.get('message', 'Unknown')}"}
-        
-        return data
-    except Exception as e:
-        return {"error": f"💥 Air quality fetch error: {str(e)}"}
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def _session_key(session_id):
+    # Only a hash of the id is stored, so a dump of the shared store does not leak live session links
+    return "session:" + hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+
+
+def restore_session_state():
+    """Load this browser's session from the shared store so any replica can serve it.
+
+    The ?sid= query parameter is a bearer token: anyone holding the full URL can load that
+    session's profile and chat history, so it must not be shared. Streamlit has no API for
+    setting cookies, so the URL is the only place that survives a move to another replica.
+    Malformed ids and ids with no stored session are replaced with a freshly issued one,
+    so a link with a chosen sid cannot be used to plant a session on someone else.
+    """
+    if "session_id" in st.session_state:
+        return
+    session_id = st.query_params.get("sid", "")
+    blob = get_kv_store().get(_session_key(session_id)) if SESSION_ID_PATTERN.fullmatch(session_id) else None
+    if blob is None:
+        session_id = uuid4().hex
+        st.query_params["sid"] = session_id
+    st.session_state.session_id = session_id
+    if blob is None:
+        return
+
+    st.session_state.session_digest = hashlib.sha256(blob).hexdigest()
+    for key, value in decode_value(blob).items():
+        st.session_state[key] = value
+
+
+def persist_session_state():
+    """Write the persisted keys back, skipping the round-trip when nothing changed"""
+    if "session_id" not in st.session_state:
+        return
+    blob = encode_value({key: st.session_state[key] for key in PERSISTED_SESSION_KEYS if key in st.session_state})
+    digest = hashlib.sha256(blob).hexdigest()
+    if digest == st.session_state.get("session_digest"):
+        return
+    get_kv_store().set(_session_key(st.session_state.session_id), blob, SESSION_TTL)
+    st.session_state.session_digest = digest
+
+
+# ========================================
+# ⏱️ RERUN PROFILER
+# ========================================
+
+PROFILER_HISTORY = 20
+PROFILER_INTERVAL = 0.005  # seconds between stack samples
+PROFILER_MAX_SECONDS = 120  # sampler gives up on runs that never finish (e.g. closed tab)
+
+# Sampled time spent under these functions is rolled up into a named bucket
+PROFILER_CATEGORIES = {
+    "_openweather_get": "upstream: OpenWeather",
+    "invoke": "upstream: Watsonx LLM",
+    "plot_forecast_chart": "chart building",
+    "export_city_report": "PDF generation",
+}
+
+
+class TracemallocUsers:
+    """Process-wide count of active profilers; tracemalloc runs while any session is profiling"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._count == 0:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            self._count += 1
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+            if self._count == 0:
+                tracemalloc.stop()
+
+
+@st.cache_resource
+def get_tracemalloc_users():
+    # Must outlive the per-rerun script namespace, otherwise each rerun would get its own counter
+    return TracemallocUsers()
+
+
+class RerunProfiler:
+    """Times one script rerun: named phases exactly, functions and stacks by sampling"""
+
+    def __init__(self, tracer, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self.started_at = datetime.now().strftime("%H:%M:%S")
+        self.section = None
+        self._thread_id = threading.get_ident()
+        self._script = os.path.abspath(__file__)
+        self._start = time.perf_counter()
+        self._phase = None
+        self._phase_start = self._start
+        self._phases = {}
+        self._samples = Counter()
+        self._done = threading.Event()
+        self._ended = None
+        self._tracer = tracer
+        self._tracer.acquire()
+        self._release_lock = threading.Lock()
+        self._peak = None
+
+        self._sampler = threading.Thread(target=self._sample, name="rerun-profiler", daemon=True)
+        self._sampler.start()
+
+    def checkpoint(self, phase, now=None):
+        """Close the running phase and start timing the next one"""
+        now = time.perf_counter() if now is None else now
+        if self._phase is not None:
+            self._phases[self._phase] = self._phases.get(self._phase, 0.0) + now - self._phase_start
+        self._phase, self._phase_start = phase, now
+
+    def _release_tracer(self):
+        """Read the allocation peak and drop this run's tracemalloc reference, exactly once"""
+        with self._release_lock:
+            if self._peak is None:
+                self._peak = tracemalloc.get_traced_memory()[1]
+                self._tracer.release()
+            return self._peak
+
+    def _sample(self):
+        # A run cut short by st.stop/st.rerun (or a closed tab) may never reach finish();
+        # the sampler releases tracemalloc as soon as it sees the run end or gives up
+        try:
+            self._sample_until_done()
+        finally:
+            self._release_tracer()
+
+    def _sample_until_done(self):
+        deadline = time.perf_counter() + PROFILER_MAX_SECONDS
+        while not self._done.wait(self.interval) and time.perf_counter() < deadline:
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, os.path.basename(code.co_filename), code.co_firstlineno, code.co_filename))
+                frame = frame.f_back
+            stack.reverse()
+            # Drop the Streamlit runner frames above this script's module frame; once that
+            # frame is gone the run has ended (normally, or via st.stop/st.rerun)
+            for i, (_, _, _, filename) in enumerate(stack):
+                if filename == self._script:
+                    stack = stack[i:]
+                    break
+            else:
+                self._ended = now
+                return
+            self._samples[tuple(f"{name} ({base}:{line})" for name, base, line, _ in stack)] += 1
+
+    def finish(self, status):
+        self._done.set()
+        self._sampler.join()
+        # An interrupted run is finished on the next rerun; end it where the script stopped, not now
+        end = self._ended if status == "interrupted" and self._ended is not None else time.perf_counter()
+        if status == "interrupted" and self._ended is None:
+            end = self._phase_start
+        self.checkpoint(None, now=end)
+        wall = end - self._start
+        peak = self._release_tracer()
+
+        total = sum(self._samples.values())
+        per_sample = wall * 1000 / total if total else 0.0
+        inclusive, own, categories = Counter(), Counter(), Counter()
+        for stack, count in self._samples.items():
+            for frame in set(stack):
+                inclusive[frame] += count
+            own[stack[-1]] += count
+            for category in {PROFILER_CATEGORIES[f.split(" ")[0]] for f in stack if f.split(" ")[0] in PROFILER_CATEGORIES}:
+                categories[category] += count
+
+        return {
+            "started": self.started_at,
+            "section": self.section,
+            "status": status,
+            "wall_ms": round(wall * 1000, 1),
+            "process_peak_alloc_kb": round(peak / 1024, 1),
+            "phases_ms": {name: round(t * 1000, 1) for name, t in self._phases.items()},
+            "categories_ms": {name: round(n * per_sample, 1) for name, n in categories.most_common()},
+            "functions": [
+                {"function": frame, "inclusive_ms": round(n * per_sample, 1), "self_ms": round(own[frame] * per_sample, 1)}
+                for frame, n in inclusive.most_common(15)
+            ],
+            "top_stacks": [
+                {"stack": " → ".join(stack[-4:]), "ms": round(n * per_sample, 1)}
+                for stack, n in self._samples.most_common(5)
+            ],
+            "folded": "\n".join(f"{';'.join(stack)} {n}" for stack, n in self._samples.items()),
+        }
+
+
+def start_rerun_profiler():
+    """Begin profiling this rerun if enabled; a run cut short by st.stop/st.rerun is recorded first"""
+    if "profiler_history" not in st.session_state:
+        st.session_state.profiler_history = deque(maxlen=PROFILER_HISTORY)
+    previous = st.session_state.get("active_profiler")
+    if previous is not None:
+        st.session_state.profiler_history.append(previous.finish("interrupted"))
+    enabled = st.session_state.get("profiler_enabled")
+    st.session_state.active_profiler = RerunProfiler(get_tracemalloc_users()) if enabled else None
+
+
+def profile_checkpoint(phase):
+    profiler = st.session_state.get("active_profiler")
+    if profiler is not None:
+        profiler.checkpoint(phase)
+
+
+def finish_rerun_profiler():
+    profiler = st.session_state.get("active_profiler")
+    if profiler is not None:
+        st.session_state.profiler_history.append(profiler.finish("complete"))
+        st.session_state.active_profiler = None
+
+
+def render_profiler():
+    st.checkbox("⏱️ Profile each rerun", key="profiler_enabled")
+    history = list(st.session_state.get("profiler_history", []))
+    if not history:
+        st.caption("No profiled reruns yet. Enable the profiler and interact with the app.")
+        return
+
+    st.dataframe(pd.DataFrame([
+        {k: run.get(k) for k in ("started", "section", "status", "wall_ms", "process_peak_alloc_kb")} for run in reversed(history)
+    ]), use_container_width=True)
+    st.caption("Allocation peak is process-wide: it includes other sessions running at the same time.")
+
+    index = st.selectbox("Inspect rerun", range(len(history) - 1, -1, -1),
+                         format_func=lambda i: f"{history[i]['started']} · {history[i]['section']} · {history[i]['wall_ms']} ms")
+    run = history[index]
+    st.write("Phases (ms):", run["phases_ms"])
+    st.write("Sampled time by category (ms):", run["categories_ms"])
+    st.dataframe(pd.DataFrame(run["functions"]), use_container_width=True)
+    st.dataframe(pd.DataFrame(run["top_stacks"]), use_container_width=True)
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.download_button("🔥 Folded stacks (flame graph)", data=run["folded"],
+                           file_name=f"rerun_{run['started'].replace(':', '')}.folded", mime="text/plain")
+    with c2:
+        st.download_button("📦 Profiler history (JSON)", data=json.dumps(history, indent=2),
+                           file_name="profiler_history.json", mime="application/json")
 
 
 # ========================================
 # 📊 DISPLAY FUNCTIONS (UNCHANGED)
 # ========================================
 
+def warn_if_stale(data):
+    """Flag responses served from the circuit breaker's last-good copy"""
+    if data.get("stale"):
+        st.warning(f"⚠️ OpenWeather is unavailable right now — showing data from {data['stale_age_s'] // 60} min ago.")
+
+
 def display_weekly_forecast(data):
     try:
         st.markdown('<hr style="margin: 10px 0;">', unsafe_allow_html=True)
@@ -147,43 +351,86 @@ def generate_forecast_summary1(forecast_data, openai_api_key):
         return None
 
 
+# Charts are sized for this many pixels; each series gets at most one point per PIXELS_PER_POINT
+CHART_WIDTH = 700
+PIXELS_PER_POINT = 2
+CHART_SPEC_CACHE_SIZE = 64
+
+
+class ChartSpecCache:
+    """LRU of Vega-Lite specs keyed by data fingerprint, shared by every session"""
+
+    def __init__(self, max_entries=CHART_SPEC_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._specs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is None:
+                self.misses += 1
+                return None
+            self._specs.move_to_end(key)
+            self.hits += 1
+            return spec
+
+    def put(self, key, spec):
+        with self._lock:
+            self._specs[key] = spec
+            while len(self._specs) > self.max_entries:
+                self._specs.popitem(last=False)
+
+
+@st.cache_resource
+def get_chart_spec_cache():
+    return ChartSpecCache()
+
+
+def render_line_chart(df, x, columns, value_name):
+    """Line chart of `columns` over `x`, downsampled to the pixel budget; unchanged data reuses its spec"""
+    params = (x, tuple(columns), value_name, CHART_WIDTH, PIXELS_PER_POINT)
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df[[x, *columns]], index=False).to_numpy().tobytes())
+    digest.update(repr(params).encode("utf-8"))
+    key = digest.hexdigest()
+
+    cache = get_chart_spec_cache()
+    spec = cache.get(key)
+    if spec is None:
+        max_points = CHART_WIDTH // PIXELS_PER_POINT
+        data = downsample_series(df, x, columns, value_name, max_points)
+        spec = (
+            alt.Chart(data)
+            .mark_line(point=len(df) <= 60)
+            .encode(x=f"{x}:T", y=f"{value_name}:Q", color="Type:N")
+            .properties(width=CHART_WIDTH)
+            .to_dict()
+        )
+        cache.put(key, spec)
+    # Streamlit pops "datasets" off the spec it is given, so hand it a shallow copy
+    st.vega_lite_chart(dict(spec), use_container_width=True)
+
+
 def plot_forecast_chart(forecast_data):
-    daily_data = []
-    seen_dates = set()
-
-    for entry in forecast_data["list"]:
-        date_str = entry["dt_txt"].split(" ")[0]
-        if date_str not in seen_dates:
-            seen_dates.add(date_str)
-            daily_data.append({
-                "Date": date_str,
-                "Min Temp (°C)": entry["main"]["temp_min"],
-                "Max Temp (°C)": entry["main"]["temp_max"],
-                "Humidity (%)": entry["main"]["humidity"],
-                "Wind Speed (m/s)": entry["wind"]["speed"]
-            })
-
-    df = pd.DataFrame(daily_data)
+    df = pd.DataFrame([
+        {
+            "Date": entry["dt_txt"],
+            "Min Temp (°C)": entry["main"]["temp_min"],
+            "Max Temp (°C)": entry["main"]["temp_max"],
+            "Humidity (%)": entry["main"]["humidity"],
+            "Wind Speed (m/s)": entry["wind"]["speed"]
+        }
+        for entry in forecast_data["list"]
+    ])
+    df["Date"] = pd.to_datetime(df["Date"])
 
     st.subheader("📉 Temperature Forecast")
-    temp_chart = (
-        alt.Chart(df)
-        .transform_fold(["Min Temp (°C)", "Max Temp (°C)"], as_=["Type", "Temperature"])
-        .mark_line(point=True)
-        .encode(x="Date:T", y="Temperature:Q", color="Type:N")
-        .properties(width=700)
-    )
-    st.altair_chart(temp_chart, use_container_width=True)
+    render_line_chart(df, "Date", ["Min Temp (°C)", "Max Temp (°C)"], "Temperature")
 
     st.subheader("💧 Humidity & Wind Speed Forecast")
-    hum_wind_chart = (
-        alt.Chart(df)
-        .transform_fold(["Humidity (%)", "Wind Speed (m/s)"], as_=["Type", "Value"])
-        .mark_line(point=True)
-        .encode(x="Date:T", y="Value:Q", color="Type:N")
-        .properties(width=700)
-    )
-    st.altair_chart(hum_wind_chart, use_container_width=True)
+    render_line_chart(df, "Date", ["Humidity (%)", "Wind Speed (m/s)"], "Value")
 
 
 def display_air_pollution(data):
@@ -221,6 +468,7 @@ LANGUAGES = {
         "environment": "🌍 Environmental Insights",
         "weather": "🌦️ Weather Forecast",
         "reports": "📊 City Reports",
+        "alerts": "🚨 Weather Alerts",
         "settings": "⚙️ Settings & Preferences",
         "footer": "© 2025 SmartCity Assistant | Built with ❤️ using Streamlit & Watsonx",
         "save_profile": "Save Profile",
@@ -236,6 +484,7 @@ LANGUAGES = {
         "environment": "🌍 Información Ambiental",
         "weather": "🌦️ Pronóstico del Tiempo",
         "reports": "📊 Informes de la Ciudad",
+        "alerts": "🚨 Alertas Meteorológicas",
         "settings": "⚙️ Configuración y Preferencias",
         "footer": "© 2025 Asistente de Ciudad Inteligente | Hecho con ❤️ usando Streamlit & Watsonx",
         "save_profile": "Guardar Perfil",
@@ -251,6 +500,7 @@ LANGUAGES = {
         "environment": "🌍 Analyse Environnementale",
         "weather": "🌦️ Météo",
         "reports": "📊 Rapports Urbains",
+        "alerts": "🚨 Alertes Météo",
         "settings": "⚙️ Paramètres et Préférences",
         "footer": "© 2025 Assistant Ville Intelligent | Réalisé avec ❤️ en utilisant Streamlit & Watsonx",
         "save_profile": "Enregistrer le Profil",
@@ -265,6 +515,9 @@ LANGUAGES = {
 
 st.set_page_config(page_title="🌆 Smart City Assistant", layout="wide", page_icon="🌆")
 
+start_rerun_profiler()
+profile_checkpoint("css injection")
+
 st.markdown("""
     <style>
         body {
@@ -335,8 +588,9 @@ st.markdown("""
         .card-environment { background: #f0f7ff; padding: 22px; margin: 15px 0; border-left: 6px solid #264DE4; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.06); }
         .card-weather { background: #fffbe6; padding: 22px; margin: 15px 0; border-left: 6px solid #F4A261; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.06); }
         .card-reports { background: #f5f5f5; padding: 22px; margin: 15px 0; border-left: 6px solid #6A7581; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.06); }
+        .card-alerts { background: #fff4f4; padding: 22px; margin: 15px 0; border-left: 6px solid #D62828; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.06); }
         .card-settings { background: #f5f5f5; padding: 22px; margin: 15px 0; border-left: 6px solid #999; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.06); }
-        .card-chat:hover, .card-traffic:hover, .card-energy:hover, .card-environment:hover, .card-weather:hover, .card-reports:hover, .card-settings:hover { transform: translateY(-2px); box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+        .card-chat:hover, .card-traffic:hover, .card-energy:hover, .card-environment:hover, .card-weather:hover, .card-reports:hover, .card-alerts:hover, .card-settings:hover { transform: translateY(-2px); box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
         
         /* Chat bubbles */
         .user-bubble, .bot-bubble { padding: 10px 15px; margin: 8px 0; border-radius: 12px; max-width: 70%; font-size: 14px; }
@@ -351,6 +605,9 @@ st.markdown("""
 # 💾 SESSION STATE INITIALIZATION
 # ========================================
 
+profile_checkpoint("session state")
+restore_session_state()
+
 if "profile_complete" not in st.session_state:
     st.session_state.profile_complete = False
 if "profile_data" not in st.session_state:
@@ -363,86 +620,40 @@ if "city_data" not in st.session_state:
     st.session_state.city_data = {}
 if "language" not in st.session_state:
     st.session_state.language = "en"
+if "prefetch_job" not in st.session_state:
+    st.session_state.prefetch_job = None
 
 # ========================================
 # 🔐 LOAD CREDENTIALS
 # ========================================
 
-# Load Watsonx credentials
-try:
-    credentials = {
-        "url": st.secrets["WATSONX_URL"],
-        "apikey": st.secrets["WATSONX_APIKEY"]
-    }
-    project_id = st.secrets["WATSONX_PROJECT_ID"]
-except KeyError as e:
-    st.warning(f"⚠️ Missing Watsonx credential: {str(e)}")
+profile_checkpoint("credentials")
+
+# Check Watsonx credentials from the same source get_llm reads (environment, then secrets.toml)
+missing_credentials = [name for name in ("WATSONX_URL", "WATSONX_APIKEY", "WATSONX_PROJECT_ID") if not get_secret(name)]
+if missing_credentials:
+    st.warning(f"⚠️ Missing Watsonx credential: {', '.join(missing_credentials)}")
     st.info("Add credentials to `.streamlit/secrets.toml`")
     st.stop()
-except Exception as e:
-    st.error(f"🚨 Error initializing LLM: {str(e)}")
-    st.stop()
 
 # Load OpenWeather API Key
-try:
-    weather_api_key = st.secrets["OPENWEATHER_APIKEY"]
-except KeyError:
+weather_api_key = get_secret("OPENWEATHER_APIKEY")
+if not weather_api_key:
     st.warning("⚠️ OpenWeather API key not found in secrets.toml")
     weather_api_key = None  # Will trigger error messages in UI
 
-model_map = {
-    "chat": "ibm/granite-3-3-8b-instruct",
-    "traffic": "ibm/granite-3-3-8b-instruct",
-    "energy": "ibm/granite-3-3-8b-instruct",
-    "environment": "ibm/granite-3-3-8b-instruct",
-    "reports": "ibm/granite-3-3-8b-instruct"
-}
+# Watchlist alerts run on a per-process background scheduler
+get_alert_engine().start()
+
+# ========================================
+# ⚡ PREDICTIVE PREFETCH
+# ========================================
+
+@st.cache_resource
+def get_prefetcher():
+    # One worker pool and hit/miss counter for every session in this process
+    return Prefetcher()
 
-def get_llm(model_name):
-    return WatsonxLLM(
-        model_id=model_map[model_name],
-        url=credentials.get("url"),
-        apikey=credentials.get("apikey"),
-        project_id=project_id,
-        params={
-            GenParams.DECODING_METHOD: "greedy",
-            GenParams.TEMPERATURE: 0.7,
-            GenParams.MIN_NEW_TOKENS: 5,
-            GenParams.MAX_NEW_TOKENS: 300,
-            GenParams.STOP_SEQUENCES: ["Human:", "Observation"],
-        },
-    )
-
-# ========================================
-# 📄 PDF EXPORT FUNCTION
-# ========================================
-
-def export_city_report():
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, txt="SmartCityAI - City Analysis Report", ln=True, align='C')
-    pdf.ln(10)
-    
-    if "profile_data" in st.session_state and st.session_state.profile_data:
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, txt="User Information", ln=True)
-        pdf.set_font("Arial", '', 12)
-        for key, value in st.session_state.profile_data.items():
-            pdf.cell(0, 10, txt=f"{key.capitalize()}: {value}", ln=True)
-    
-    pdf.ln(10)
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 10, txt="Recent City Metrics", ln=True)
-    pdf.set_font("Arial", '', 12)
-    pdf.cell(0, 10, txt=f"Avg Traffic Delay: {st.session_state.city_data.get('traffic_delay', 'N/A')} mins", ln=True)
-    pdf.cell(0, 10, txt=f"Avg CO2 Level: {st.session_state.city_data.get('co2_level', 'N/A')} ppm", ln=True)
-    pdf.cell(0, 10, txt=f"Energy Use: {st.session_state.city_data.get('energy_use', 'N/A')} kWh/day", ln=True)
-    pdf.cell(0, 10, txt=f"Waste Collected: {st.session_state.city_data.get('waste_ton', 'N/A')} tons", ln=True)
-    
-    pdf_output = pdf.output(dest='S').encode('latin-1')
-    return pdf_output
 
 # ========================================
 # 🧭 NAVIGATION BAR
@@ -451,7 +662,7 @@ def export_city_report():
 def render_navbar():
     lang = st.session_state.language
     st.markdown('<div class="navbar">', unsafe_allow_html=True)
-    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
     
     with col1:
         if st.button(LANGUAGES[lang]["chat"], key="btn_chat", use_container_width=True, disabled=not st.session_state.profile_complete):
@@ -469,6 +680,9 @@ def render_navbar():
         if st.button(LANGUAGES[lang]["weather"], key="btn_weather", use_container_width=True, disabled=not st.session_state.profile_complete):
             st.session_state.current_section = "weather"
     with col6:
+        if st.button(LANGUAGES[lang]["alerts"], key="btn_alerts", use_container_width=True, disabled=not st.session_state.profile_complete):
+            st.session_state.current_section = "alerts"
+    with col7:
         if st.button("🧾", key="btn_profile", use_container_width=True):
             st.session_state.current_section = "profile"
     st.markdown('</div>', unsafe_allow_html=True)
@@ -484,27 +698,44 @@ def save_profile(name, role, department, location):
         "department": department,
         "location": location
     }
+    if st.session_state.get("prefetch_job") is not None:
+        get_prefetcher().cancel(st.session_state.prefetch_job)
+    st.session_state.prefetch_job = get_prefetcher().start(location, weather_api_key)
     st.session_state.profile_complete = True
     st.success("✅ Profile saved successfully!")
     st.session_state.current_section = "weather"
+    persist_session_state()
     st.rerun()
 
 def reset_profile():
+    if st.session_state.get("prefetch_job") is not None:
+        get_prefetcher().cancel(st.session_state.prefetch_job)
+        st.session_state.prefetch_job = None
     st.session_state.profile_complete = False
     st.session_state.profile_data = {}
     st.session_state.messages = []
     st.session_state.city_data = {}
+    persist_session_state()
     st.rerun()
 
 # ========================================
 # 🎨 HEADER & MAIN LAYOUT
 # ========================================
 
+profile_checkpoint("header & navbar")
 lang = st.session_state.language
 st.markdown(f'<h1 style="text-align:center;">{LANGUAGES[lang]["title"]}</h1>', unsafe_allow_html=True)
 st.markdown(f'<p style="text-align:center; font-size:16px;">{LANGUAGES[lang]["subtitle"]}</p>', unsafe_allow_html=True)
 render_navbar()
 
+# Prefetch only serves the weather dashboard; stop it once the user goes elsewhere
+if st.session_state.prefetch_job is not None and st.session_state.current_section != "weather":
+    get_prefetcher().cancel(st.session_state.prefetch_job)
+
+profile_checkpoint(f"section: {st.session_state.current_section}")
+if st.session_state.active_profiler is not None:
+    st.session_state.active_profiler.section = st.session_state.current_section
+
 # ========================================
 # ⚙️ SETTINGS SECTION
 # ========================================
@@ -586,9 +817,11 @@ elif st.session_state.current_section == "chat":
                 llm = get_llm("chat")
                 response = llm.invoke(user_input)
                 st.session_state.messages.append(("assistant", response))
+                persist_session_state()
                 st.rerun()
             except Exception as e:
                 st.session_state.messages.append(("assistant", f"Error: {str(e)}"))
+                persist_session_state()
                 st.rerun()
     
     st.markdown('Grateful for your time—our assistant is here to help anytime you need!!')
@@ -660,7 +893,9 @@ elif st.session_state.current_section == "weather":
         st.info("Get your free key: https://home.openweathermap.org/api_keys")
         st.stop()
 
-    city = st.text_input("🏙️ Enter City Name", placeholder="e.g., London, Tokyo, New York, Paris,FR")
+    prefetch_job = st.session_state.prefetch_job
+    city = st.text_input("🏙️ Enter City Name", value=st.session_state.profile_data.get("location", ""),
+                         placeholder="e.g., London, Tokyo, New York, Paris,FR")
     
     # API Key Test Button
     if st.button("🔑 Test API Key"):
@@ -676,12 +911,14 @@ elif st.session_state.current_section == "weather":
     with col1:
         if st.button("🌡️ Current Weather", use_container_width=True):
             if city:
+                get_prefetcher().record_lookup(prefetch_job, city, "weather")
                 with st.spinner("Fetching weather..."):
                     data = get_weather_data(city, weather_api_key)
                     if "error" in data:
                         st.error(data["error"])
                         st.info("💡 Try: 'City,Country' format (e.g., 'Paris,FR') or check spelling")
                     else:
+                        warn_if_stale(data)
                         st.markdown(f"""
                             ### {data['name']}, {data['sys']['country']}
                             **🌡️ Temperature:** {data['main']['temp']}°C  
@@ -696,6 +933,7 @@ elif st.session_state.current_section == "weather":
     with col2:
         if st.button("📅 Weekly Forecast", use_container_width=True):
             if city:
+                get_prefetcher().record_lookup(prefetch_job, city, "forecast")
                 with st.spinner("Fetching forecast..."):
                     current = get_weather_data(city, weather_api_key)
                     if "error" in current:
@@ -707,6 +945,7 @@ elif st.session_state.current_section == "weather":
                         if "error" in forecast:
                             st.error(forecast["error"])
                         else:
+                            warn_if_stale(forecast)
                             display_weekly_forecast(forecast)
                             plot_forecast_chart(forecast)
             else:
@@ -715,6 +954,7 @@ elif st.session_state.current_section == "weather":
     with col3:
         if st.button("🌫️ Air Quality", use_container_width=True):
             if city:
+                get_prefetcher().record_lookup(prefetch_job, city, "air_pollution")
                 with st.spinner("Fetching air quality..."):
                     current = get_weather_data(city, weather_api_key)
                     if "error" in current:
@@ -726,10 +966,24 @@ elif st.session_state.current_section == "weather":
                         if "error" in aqi_data:
                             st.error(aqi_data["error"])
                         else:
+                            warn_if_stale(aqi_data)
                             display_air_pollution(aqi_data)
             else:
                 st.warning("Please enter a city name first.")
 
+    # AI summary warmed by the profile prefetch; only an explicit request counts as a lookup
+    if st.button("🤖 AI City Summary", use_container_width=True):
+        if city:
+            get_prefetcher().record_lookup(prefetch_job, city, "summary")
+            with st.spinner("Summarizing city conditions..."):
+                try:
+                    summary = get_city_summary(city)
+                except Exception as e:
+                    summary = f"Error: {str(e)}"
+            st.markdown(f'<div class="bot-bubble">{summary}</div>', unsafe_allow_html=True)
+        else:
+            st.warning("Please enter a city name first.")
+
     # Helpful Info Box
     with st.expander("ℹ️ OpenWeather API Tips"):
         st.markdown("""
@@ -739,11 +993,51 @@ elif st.session_state.current_section == "weather":
         - 📊 Free tier: **60 calls/minute**, **1,000,000 calls/month**
         - 🌐 All endpoints use `https://` and `appid=` parameter
         - 🔄 This app caches requests for 5 minutes to avoid rate limits
+        - ⛔ After repeated failures calls pause briefly and the last good data is shown instead
         """)
 
     st.markdown('Grateful for your time—our assistant is here to help anytime you need!!')
     st.markdown('</div>', unsafe_allow_html=True)
 
+# ========================================
+# 🚨 WEATHER ALERTS SECTION
+# ========================================
+
+elif st.session_state.current_section == "alerts":
+    st.markdown('<div class="card-alerts">', unsafe_allow_html=True)
+    st.markdown(f'<h2>{LANGUAGES[lang]["alerts"]}</h2>', unsafe_allow_html=True)
+    engine = get_alert_engine()
+
+    if not weather_api_key:
+        st.error("🚨 OpenWeatherMap API key missing! Alerts need `OPENWEATHER_APIKEY` in `.streamlit/secrets.toml`")
+
+    watchlist = st.text_area("🏙️ Watched cities (one per line)", value="\n".join(engine.get_watchlist()), height=150)
+    c1, c2 = st.columns(2)
+    with c1:
+        if st.button("💾 Save Watchlist", use_container_width=True):
+            saved = engine.set_watchlist(watchlist.splitlines())
+            engine.trigger()
+            st.success(f"Watching {len(saved)} cities.")
+    with c2:
+        if st.button("🔄 Run Check Now", use_container_width=True):
+            # Paced cycles can take minutes; the scheduler picks this up within a minute
+            engine.trigger()
+            st.info("Check scheduled. New alerts will appear in the feed below.")
+
+    stats = engine.snapshot()
+    if "last_cycle" in stats:
+        st.caption(f"Last check {stats['last_cycle']} · {stats['cities_fetched']} fetched, {stats['cities_with_data']}/{stats['cities']} with data · "
+                   f"evaluated in {stats['evaluation_ms']} ms · next check every {stats['interval_s'] // 60} min")
+
+    feed = engine.feed()
+    if feed:
+        st.dataframe(pd.DataFrame(feed)[["severity", "city", "message", "at", "published"]], use_container_width=True)
+    else:
+        st.info("No alerts yet. Add cities to the watchlist and they will be checked automatically.")
+
+    st.markdown('Grateful for your time—our assistant is here to help anytime you need!!')
+    st.markdown('</div>', unsafe_allow_html=True)
+
 # ========================================
 # 📊 PROGRESS REPORTS SECTION
 # ========================================
@@ -773,7 +1067,7 @@ elif st.session_state.current_section == "reports":
     if st.session_state.profile_complete and st.session_state.city_data:
         st.download_button(
             label=LANGUAGES[lang]["export_pdf"],
-            data=export_city_report(),
+            data=export_city_report(st.session_state.profile_data, st.session_state.city_data),
             file_name="city_report.pdf",
             mime="application/pdf"
         )
@@ -785,6 +1079,7 @@ elif st.session_state.current_section == "reports":
 # 🔧 DEBUG MODE (OPTIONAL)
 # ========================================
 
+profile_checkpoint("debug mode")
 with st.expander("🔧 Debug Mode"):
     st.write("Session State Keys:", list(st.session_state.keys()))
     if weather_api_key:
@@ -793,9 +1088,25 @@ with st.expander("🔧 Debug Mode"):
         st.write("❌ OpenWeather API Key: Missing")
     st.write("Profile Complete:", st.session_state.profile_complete)
     st.write("Current Section:", st.session_state.current_section)
+    st.write("OpenWeather Quota:", get_openweather_quota().snapshot())
+    st.write("Prefetch:", get_prefetcher().snapshot())
+    kv_store = get_kv_store()
+    st.write("Shared Store:", kv_store.name, "— cache hits", kv_store.hits, "/ misses", kv_store.misses,
+             "/ errors", getattr(kv_store, "errors", 0))
+    st.write("Session ID:", st.session_state.get("session_id"))
+    if st.session_state.prefetch_job is not None:
+        st.write("Prefetch Job:", st.session_state.prefetch_job.location, "—", st.session_state.prefetch_job.status)
+    st.write("Alert Engine:", get_alert_engine().snapshot())
+    chart_cache = get_chart_spec_cache()
+    st.write("Chart Spec Cache:", chart_cache.hits, "hits /", chart_cache.misses, "misses")
+    render_profiler()
+
+persist_session_state()
 
 # ========================================
 # 🦶 FOOTER
 # ========================================
 
 st.markdown(f'<p class="footer">{LANGUAGES[lang]["footer"]}</p>', unsafe_allow_html=True)
+
+finish_rerun_profiler()
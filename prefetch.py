@@ -0,0 +1,119 @@
+"""Background warm-up of a profile location's weather, forecast, air quality and AI summary.
+
+Saving a profile starts a PrefetchJob so the weather dashboard's first lookups hit the
+shared caches in smartcity.py. Prefetcher counts those lookups as hits or misses.
+Nothing in here touches Streamlit; app.py keeps one Prefetcher per process.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from smartcity import (
+    get_air_pollution_data,
+    get_city_summary,
+    get_weather_data,
+    get_weekly_forecast,
+)
+
+
+class PrefetchJob:
+    """Background warm-up for one session's profile location"""
+
+    def __init__(self, location):
+        self.location = location
+        self.status = "pending"
+        self.results = {}
+        self.served = set()
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        """Stop before the next stage; True only for the call that actually cancelled the job"""
+        if self.done or self._cancelled.is_set():
+            return False
+        self._cancelled.set()
+        if self.future is not None and self.future.cancel():
+            self.status = "cancelled"
+        return True
+
+    def matches(self, city):
+        return bool(city) and city.strip().lower() == self.location.strip().lower()
+
+
+class Prefetcher:
+    """Shared worker pool that warms weather, forecast, AQI and AI summary caches"""
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._started = 0
+        self._cancelled = 0
+        self._hits = 0
+        self._misses = 0
+
+    def start(self, location, weather_api_key):
+        job = PrefetchJob(location)
+        job.future = self._executor.submit(self._run, job, weather_api_key)
+        with self._lock:
+            self._started += 1
+        return job
+
+    def _run(self, job, weather_api_key):
+        job.status = "running"
+        try:
+            if weather_api_key:
+                current = self._stage(job, "weather", get_weather_data, job.location, weather_api_key)
+                if current is not None and "error" not in current:
+                    lat, lon = current["coord"]["lat"], current["coord"]["lon"]
+                    self._stage(job, "forecast", get_weekly_forecast, weather_api_key, lat, lon)
+                    self._stage(job, "air_pollution", get_air_pollution_data, lat, lon, weather_api_key)
+            self._stage(job, "summary", get_city_summary, job.location)
+        except Exception as e:
+            job.results["error"] = str(e)
+            job.status = "failed"
+            return
+        job.status = "cancelled" if job.cancelled else "done"
+
+    def _stage(self, job, name, fetch, *args):
+        if job.cancelled:
+            return None
+        job.results[name] = fetch(*args)
+        return job.results[name]
+
+    def cancel(self, job):
+        if job.cancel():
+            with self._lock:
+                self._cancelled += 1
+
+    def record_lookup(self, job, city, stage):
+        """Count a dashboard lookup as a hit if the session's prefetch already warmed it"""
+        if job is not None and job.matches(city):
+            if stage in job.served:
+                return stage in job.results
+            job.served.add(stage)
+        hit = job is not None and job.matches(city) and stage in job.results \
+            and not (isinstance(job.results[stage], dict) and "error" in job.results[stage])
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return hit
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "prefetches_started": self._started,
+                "prefetches_cancelled": self._cancelled,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": f"{self._hits / lookups:.0%}" if lookups else "N/A",
+            }
@@ -0,0 +1,315 @@
+"""Headless HTTP API and batch CLI over the SmartCity fetch and analysis functions.
+
+Uses the same shared caches, OpenWeather quota and LLM client as the Streamlit UI
+(see smartcity.py), without paying for a script rerun per request.
+
+    python service.py serve --host 0.0.0.0 --port 8080
+    python service.py batch cities.txt --include weather,forecast,air_quality > out.jsonl
+    python service.py report --profile profile.json --city-data metrics.json -o city_report.pdf
+    python service.py alerts --cities watchlist.txt > alerts.jsonl
+"""
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from alerts import get_alert_engine
+from smartcity import (
+    export_city_report,
+    get_air_pollution_data,
+    get_city_summary,
+    get_kv_store,
+    get_llm,
+    get_openweather_quota,
+    get_secret,
+    get_weather_data,
+    get_weekly_forecast,
+    model_map,
+    paced_calls,
+)
+
+INCLUDE_CHOICES = ("weather", "forecast", "air_quality", "summary")
+
+# Blocking upstream calls (requests, Watsonx, FPDF) run here so the event loop stays free
+EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="smartcity-service")
+
+# ========================================
+# 🏙️ CITY LOOKUPS
+# ========================================
+
+def fetch_city(city, include, weather_api_key):
+    """Resolve a city and collect the requested sections into one JSON-able dict"""
+    result = {"city": city}
+    current = get_weather_data(city, weather_api_key)
+    if "weather" in include:
+        result["weather"] = current
+    if "error" in current:
+        result["error"] = current["error"]
+        if "status" in current:
+            result["status"] = current["status"]
+        return result
+
+    lat, lon = current["coord"]["lat"], current["coord"]["lon"]
+    if "forecast" in include:
+        result["forecast"] = get_weekly_forecast(weather_api_key, lat, lon)
+    if "air_quality" in include:
+        result["air_quality"] = get_air_pollution_data(lat, lon, weather_api_key)
+    if "summary" in include:
+        result["summary"] = get_city_summary(city)
+    return result
+
+
+def parse_include(value):
+    include = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = set(include) - set(INCLUDE_CHOICES)
+    if unknown:
+        raise ValueError(f"Unknown include value(s): {', '.join(sorted(unknown))}")
+    return include
+
+
+def resolve_coords(params, weather_api_key):
+    """Accept either ?lat=&lon= or ?city= and return (lat, lon) or an error dict"""
+    if "lat" in params and "lon" in params:
+        return float(params["lat"]), float(params["lon"])
+    if params.get("city"):
+        current = get_weather_data(params["city"], weather_api_key)
+        if "error" in current:
+            return current
+        return current["coord"]["lat"], current["coord"]["lon"]
+    return {"error": "Pass either 'city' or both 'lat' and 'lon'.", "status": 400}
+
+# ========================================
+# 🌐 HTTP API
+# ========================================
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, partial(func, *args))
+
+
+def build_app():
+    from aiohttp import web
+
+    weather_api_key = get_secret("OPENWEATHER_APIKEY")
+
+    def respond(data):
+        # Error dicts may carry the HTTP status (404 for unknown cities); anything else is an upstream failure
+        if isinstance(data, dict) and "error" in data:
+            return web.json_response(data, status=data.get("status", 502))
+        # Circuit-breaker fallbacks carry "stale"/"stale_age_s"; surface them for clients that only read headers
+        stale = [section for section in (data, *data.values()) if isinstance(section, dict) and section.get("stale")]
+        headers = {"X-Data-Stale": "true", "X-Data-Age": str(max(s["stale_age_s"] for s in stale))} if stale else None
+        return web.json_response(data, headers=headers)
+
+    def bad_request(message):
+        return web.json_response({"error": message}, status=400)
+
+    async def read_json_object(request):
+        """Request body as a dict, or None if it is not a JSON object"""
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    @web.middleware
+    async def require_weather_key(request, handler):
+        if request.path in ("/weather", "/forecast", "/air-quality", "/city") and not weather_api_key:
+            return web.json_response({"error": "OPENWEATHER_APIKEY is not configured."}, status=503)
+        return await handler(request)
+
+    def health_snapshot():
+        store = get_kv_store()
+        return {
+            "status": "ok",
+            "openweather_quota": get_openweather_quota().snapshot(),
+            "store": {"backend": store.name, "hits": store.hits, "misses": store.misses},
+        }
+
+    async def health(request):
+        # Quota and engine snapshots read the shared store; with Redis that is network I/O
+        return web.json_response(await run_blocking(health_snapshot))
+
+    async def weather(request):
+        city = request.query.get("city")
+        if not city:
+            return bad_request("Missing 'city' query parameter.")
+        return respond(await run_blocking(get_weather_data, city, weather_api_key))
+
+    async def forecast(request):
+        try:
+            coords = await run_blocking(resolve_coords, dict(request.query), weather_api_key)
+        except ValueError as e:
+            return bad_request(str(e))
+        if isinstance(coords, dict):
+            return respond(coords)
+        return respond(await run_blocking(get_weekly_forecast, weather_api_key, *coords))
+
+    async def air_quality(request):
+        try:
+            coords = await run_blocking(resolve_coords, dict(request.query), weather_api_key)
+        except ValueError as e:
+            return bad_request(str(e))
+        if isinstance(coords, dict):
+            return respond(coords)
+        return respond(await run_blocking(get_air_pollution_data, *coords, weather_api_key))
+
+    async def city(request):
+        name = request.query.get("city")
+        if not name:
+            return bad_request("Missing 'city' query parameter.")
+        try:
+            include = parse_include(request.query.get("include", "weather,forecast,air_quality"))
+        except ValueError as e:
+            return bad_request(str(e))
+        return respond(await run_blocking(fetch_city, name, include, weather_api_key))
+
+    async def llm(request):
+        model_name = request.match_info["model"]
+        if model_name not in model_map:
+            return bad_request(f"Unknown model '{model_name}'. Choose from: {', '.join(model_map)}")
+        body = await read_json_object(request)
+        if body is None:
+            return bad_request("Request body must be a JSON object.")
+        if not body.get("prompt"):
+            return bad_request("Missing 'prompt' in request body.")
+        try:
+            response = await run_blocking(lambda: get_llm(model_name).invoke(body["prompt"]))
+        except Exception as e:
+            return web.json_response({"error": f"LLM error: {str(e)}"}, status=502)
+        return web.json_response({"model": model_name, "response": response})
+
+    async def alerts(request):
+        engine = get_alert_engine()
+        try:
+            limit = int(request.query.get("limit", 100))
+        except ValueError:
+            return bad_request("'limit' must be an integer.")
+        return web.json_response(await run_blocking(lambda: {"engine": engine.snapshot(), "alerts": engine.feed(limit)}))
+
+    async def report(request):
+        body = await read_json_object(request)
+        if body is None:
+            return bad_request("Request body must be a JSON object.")
+        profile, city_data = body.get("profile", {}), body.get("city_data", {})
+        if not isinstance(profile, dict) or not isinstance(city_data, dict):
+            return bad_request("'profile' and 'city_data' must be JSON objects.")
+        try:
+            pdf = await run_blocking(export_city_report, profile, city_data)
+        except UnicodeEncodeError:
+            # The PDF uses a core Latin-1 font
+            return web.json_response({"error": "Report text must be Latin-1 (no emoji or non-Latin scripts)."},
+                                     status=422)
+        return web.Response(body=pdf, content_type="application/pdf",
+                            headers={"Content-Disposition": 'attachment; filename="city_report.pdf"'})
+
+    app = web.Application(middlewares=[require_weather_key])
+    app.add_routes([
+        web.get("/health", health),
+        web.get("/weather", weather),
+        web.get("/forecast", forecast),
+        web.get("/air-quality", air_quality),
+        web.get("/city", city),
+        web.post("/llm/{model}", llm),
+        web.post("/report", report),
+        web.get("/alerts", alerts),
+    ])
+    get_alert_engine().start()
+    return app
+
+# ========================================
+# 🖥️ CLI
+# ========================================
+
+def cmd_serve(args):
+    from aiohttp import web
+    web.run_app(build_app(), host=args.host, port=args.port)
+
+
+def cmd_batch(args):
+    weather_api_key = get_secret("OPENWEATHER_APIKEY")
+    if not weather_api_key:
+        sys.exit("OPENWEATHER_APIKEY is not configured.")
+    try:
+        include = parse_include(args.include)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    source = sys.stdin if args.cities == "-" else open(args.cities, encoding="utf-8")
+    with source:
+        cities = [line.strip() for line in source if line.strip() and not line.startswith("#")]
+
+    def fetch_paced(city):
+        # Batch jobs wait for the background share of the quota instead of
+        # tripping the breaker and starving interactive requests
+        with paced_calls():
+            return fetch_city(city, include, weather_api_key)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failures = 0
+    with out, ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="smartcity-batch") as pool:
+        for result in pool.map(fetch_paced, cities):
+            failures += "error" in result
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    if failures:
+        print(f"{failures}/{len(cities)} cities failed", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_report(args):
+    profile = json.load(open(args.profile, encoding="utf-8")) if args.profile else {}
+    city_data = json.load(open(args.city_data, encoding="utf-8")) if args.city_data else {}
+    with open(args.output, "wb") as f:
+        f.write(export_city_report(profile, city_data))
+
+
+def cmd_alerts(args):
+    if not get_secret("OPENWEATHER_APIKEY"):
+        sys.exit("OPENWEATHER_APIKEY is not configured.")
+    engine = get_alert_engine()
+    cities = None
+    if args.cities:
+        with open(args.cities, encoding="utf-8") as f:
+            cities = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    new_alerts = engine.run_cycle(cities)
+    if new_alerts is None:
+        sys.exit("Another alert cycle is already running; try again when it finishes.")
+    for alert in new_alerts:
+        print(json.dumps(alert, ensure_ascii=False))
+    print(json.dumps(engine.snapshot()), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SmartCity headless service")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the async HTTP API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.set_defaults(func=cmd_serve)
+
+    batch = sub.add_parser("batch", help="Fetch many cities and print JSON lines")
+    batch.add_argument("cities", help="File with one city per line, or '-' for stdin")
+    batch.add_argument("--include", default="weather,forecast,air_quality",
+                       help=f"Comma-separated subset of: {', '.join(INCLUDE_CHOICES)}")
+    batch.add_argument("-o", "--output", default="-", help="Output file, or '-' for stdout")
+    batch.add_argument("--workers", type=int, default=4, help="Concurrent city lookups (default: 4)")
+    batch.set_defaults(func=cmd_batch)
+
+    report = sub.add_parser("report", help="Render the city PDF report")
+    report.add_argument("--profile", help="JSON file with profile fields")
+    report.add_argument("--city-data", help="JSON file with city metrics")
+    report.add_argument("-o", "--output", default="city_report.pdf")
+    report.set_defaults(func=cmd_report)
+
+    alerts = sub.add_parser("alerts", help="Run one alert cycle and print new alerts as JSON lines")
+    alerts.add_argument("--cities", help="File with one city per line (defaults to the shared watchlist)")
+    alerts.set_defaults(func=cmd_alerts)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,727 @@
+"""SmartCity fetch and analysis logic shared by the Streamlit UI and the headless service.
+
+Nothing in here touches Streamlit, so caches, the OpenWeather quota and the
+LLM client behave the same whether called from app.py or service.py.
+"""
+from langchain_ibm import WatsonxLLM
+from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
+from datetime import datetime
+from fpdf import FPDF
+import requests
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from collections import OrderedDict
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import os
+import threading
+import time
+import tomllib
+import zlib
+
+# ========================================
+# 🔐 SECRETS
+# ========================================
+
+SECRETS_PATHS = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+)
+
+
+@lru_cache(maxsize=None)
+def _load_secrets_file():
+    """Same lookup order as st.secrets: the project file overrides the global one"""
+    secrets = {}
+    for path in SECRETS_PATHS:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                secrets.update(tomllib.load(f))
+    return secrets
+
+
+def get_secret(name, default=None):
+    """Environment variable first, then .streamlit/secrets.toml"""
+    return os.environ.get(name) or _load_secrets_file().get(name, default)
+
+
+# ========================================
+# 🗄️ SHARED CACHE STORE
+# ========================================
+
+_RAW, _ZLIB = b"r", b"z"
+
+
+def encode_value(value):
+    """Compact wire format: minified JSON, zlib-compressed once it is worth it"""
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    if len(raw) > 512:
+        return _ZLIB + zlib.compress(raw, 6)
+    return _RAW + raw
+
+
+def decode_value(blob):
+    tag, body = blob[:1], blob[1:]
+    if tag == _ZLIB:
+        body = zlib.decompress(body)
+    return json.loads(body.decode("utf-8"))
+
+
+class InProcessStore:
+    """Default backend: a size-bounded LRU dict with TTLs, shared by every session in this process"""
+
+    name = "in-process"
+
+    def __init__(self, max_entries=10_000, sweep_every=256):
+        self.max_entries = max_entries
+        self.sweep_every = sweep_every
+        self._lock = threading.RLock()
+        self._data = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                return item[0]
+            self._data.pop(key, None)
+            return None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            self._after_write()
+
+    def add(self, key, value, ttl=None):
+        """Set only if the key is absent; True if this call set it"""
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self.set(key, value, ttl)
+            return True
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomic counter; ttl applies only when the counter is created"""
+        with self._lock:
+            current = self.get(key)
+            if current is None:
+                value = amount
+                self.set(key, str(value).encode(), ttl)
+            else:
+                value = int(current) + amount
+                self._data[key] = (str(value).encode(), self._data[key][1])
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _after_write(self):
+        """Drop expired keys every `sweep_every` writes, then evict least recently used beyond the cap"""
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            now = time.monotonic()
+            for key in [k for k, (_, expires) in self._data.items() if expires is not None and expires <= now]:
+                del self._data[key]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class LocalRedisStandIn:
+    """In-memory stand-in exposing the subset of the redis client API that RedisStore uses"""
+
+    def __init__(self):
+        self._store = InProcessStore()
+
+    def get(self, name):
+        return self._store.get(name)
+
+    def set(self, name, value, ex=None, nx=False):
+        if nx:
+            return self._store.add(name, value, ex) or None
+        self._store.set(name, value, ex)
+        return True
+
+    def incr(self, name, amount=1):
+        return self._store.incr(name, amount)
+
+    def expire(self, name, time):
+        value = self._store.get(name)
+        if value is None:
+            return False
+        self._store.set(name, value, time)
+        return True
+
+    def delete(self, *names):
+        for name in names:
+            self._store.delete(name)
+        return len(names)
+
+
+class RedisStore:
+    """Networked backend shared by every replica behind the load balancer.
+
+    Client errors in `errors` are counted and treated as a miss / skipped write,
+    so a Redis outage degrades to uncached calls instead of failing every page.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, errors=()):
+        self._client = client
+        self._errors = errors
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        try:
+            return self._client.get(key)
+        except self._errors:
+            self.errors += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        try:
+            self._client.set(key, value, ex=int(ttl) if ttl else None)
+        except self._errors:
+            self.errors += 1
+
+    def add(self, key, value, ttl=None):
+        try:
+            return bool(self._client.set(key, value, ex=int(ttl) if ttl else None, nx=True))
+        except self._errors:
+            self.errors += 1
+            return False
+
+    def incr(self, key, amount=1, ttl=None):
+        """Returns the new value, or None when the store is unreachable"""
+        try:
+            value = self._client.incr(key, amount)
+            if ttl and value == amount:
+                self._client.expire(key, int(ttl))
+            return value
+        except self._errors:
+            self.errors += 1
+            return None
+
+    def delete(self, key):
+        try:
+            self._client.delete(key)
+        except self._errors:
+            self.errors += 1
+
+
+REDIS_TIMEOUT = 1.0  # seconds, for both connecting and each command
+
+
+@lru_cache(maxsize=None)
+def get_kv_store():
+    """Pick the backend from SHARED_STATE_URL (secrets or env): redis://..., memory:// or unset"""
+    url = get_secret("SHARED_STATE_URL")
+
+    if not url:
+        return InProcessStore()
+    if url == "memory://":
+        store = RedisStore(LocalRedisStandIn())
+        store.name = "redis (local stand-in)"
+        return store
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError(f"SHARED_STATE_URL is set to {url!r} but the 'redis' package is not installed") from e
+    # Fail fast on a dead or blackholed Redis so callers fall back instead of hanging for the
+    # OS TCP timeout; ?socket_timeout=...&socket_connect_timeout=... in the URL overrides this
+    client = redis.Redis.from_url(url, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT)
+    return RedisStore(client, errors=(redis.RedisError,))
+
+
+def shared_cache(ttl):
+    """Drop-in for st.cache_data backed by get_kv_store(); exceptions are not cached"""
+    def decorator(func):
+        prefix = f"cache:{func.__qualname__}:"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            store = get_kv_store()
+            key = prefix + hashlib.sha256(encode_value([args, sorted(kwargs.items())])).hexdigest()
+            blob = store.get(key)
+            if blob is not None:
+                store.hits += 1
+                return decode_value(blob)
+            store.misses += 1
+            value = func(*args, **kwargs)
+            store.set(key, encode_value(value), ttl)
+            return value
+
+        return wrapper
+    return decorator
+
+
+# ========================================
+# 🚥 OPENWEATHER QUOTA & CIRCUIT BREAKER
+# ========================================
+
+class OpenWeatherUnavailable(Exception):
+    """Raised when a call is refused or fails upstream; never cached by shared_cache"""
+
+
+class OpenWeatherQuota:
+    """Per-minute/monthly call budget plus a closed/open/half-open circuit breaker.
+
+    Counters and breaker state live in `store`, so every process using the same shared
+    store (see get_kv_store) draws on one OpenWeather budget and trips one breaker. If the
+    store is unreachable its counters read as unknown and calls are let through.
+    """
+
+    def __init__(self, store, per_minute=60, per_month=1_000_000, failure_threshold=3,
+                 recovery_timeout=30, half_open_trials=1, stale_entries=256, prefix="quota:",
+                 interactive_reserve=20):
+        self.per_minute = per_minute
+        self.interactive_reserve = interactive_reserve
+        self.per_month = per_month
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_trials = half_open_trials
+        self.stale_entries = stale_entries
+        self._store = store
+        self._prefix = prefix
+
+        self._lock = threading.Lock()
+        self._rejected = 0
+        self._stale = OrderedDict()
+        self._stale_served = 0
+
+    def _key(self, name):
+        return self._prefix + name
+
+    def _minute_key(self, now):
+        return self._key(f"minute:{int(now // 60)}")
+
+    def _month_key(self):
+        return self._key(f"month:{datetime.now().strftime('%Y-%m')}")
+
+    def state(self, now=None):
+        now = time.time() if now is None else now
+        if self._store.get(self._key("tripped")) is None:
+            return "closed"
+        open_until = self._store.get(self._key("open_until"))
+        if open_until is not None and float(open_until) > now:
+            return "open"
+        return "half_open"
+
+    def _refuse(self, reason, retry_in, count):
+        if count:
+            with self._lock:
+                self._rejected += 1
+        return reason, retry_in
+
+    def _reserve(self, minute_limit, count=True):
+        """Returns (None, 0) if a call was reserved, else (reason, seconds before retrying is worthwhile)"""
+        now = time.time()
+        state = self.state(now)
+        if state == "open":
+            open_until = self._store.get(self._key("open_until"))
+            retry_in = int(float(open_until) - now) + 1 if open_until is not None else 1
+            return self._refuse(f"⛔ OpenWeather unavailable (circuit open). Retrying automatically in {retry_in}s.",
+                                retry_in, count)
+
+        probe = False
+        if state == "half_open":
+            trials = self._store.incr(self._key("probes"), 1, ttl=self.recovery_timeout)
+            if trials is not None and trials > self.half_open_trials:
+                self._store.incr(self._key("probes"), -1)
+                return self._refuse("⛔ OpenWeather recovery probe in progress. Please retry shortly.", 1, count)
+            probe = True
+
+        minute_key = self._minute_key(now)
+        used = self._store.incr(minute_key, 1, ttl=120)
+        if used is not None and used > minute_limit:
+            self._store.incr(minute_key, -1)
+            if probe:
+                self._store.incr(self._key("probes"), -1)
+            retry_in = int(60 - now % 60) + 1
+            return self._refuse(f"⚠️ Per-minute budget of {minute_limit} calls used. Retry in {retry_in}s.", retry_in, count)
+
+        month_key = self._month_key()
+        used = self._store.incr(month_key, 1, ttl=32 * 24 * 3600)
+        if used is not None and used > self.per_month:
+            self._store.incr(month_key, -1)
+            self._store.incr(minute_key, -1)
+            if probe:
+                self._store.incr(self._key("probes"), -1)
+            return self._refuse(f"⚠️ Monthly budget of {self.per_month:,} calls used.", 3600, count)
+        return None, 0
+
+    def acquire(self):
+        """Reserve one call. Returns None if allowed, otherwise the reason it was refused."""
+        reason, _ = self._reserve(self.per_minute)
+        return reason
+
+    def acquire_paced(self, deadline=None):
+        """Background reservation: waits for budget left over after the interactive reserve.
+
+        Gives up at `deadline` (a time.time() value; None waits indefinitely) and then
+        returns the last refusal reason, like acquire().
+        """
+        limit = max(1, self.per_minute - self.interactive_reserve)
+        while True:
+            reason, retry_in = self._reserve(limit, count=False)
+            if reason is None:
+                return None
+            wait = retry_in if deadline is None else min(retry_in, deadline - time.time())
+            if wait <= 0:
+                with self._lock:
+                    self._rejected += 1
+                return reason
+            time.sleep(wait)
+
+    def record_success(self):
+        self._store.delete(self._key("failures"))
+        if self._store.get(self._key("tripped")) is not None:
+            for name in ("tripped", "open_until", "probes"):
+                self._store.delete(self._key(name))
+
+    def release(self):
+        """Give back a call that ended without a verdict so a half-open probe slot is never leaked"""
+        if self.state() == "half_open":
+            remaining = self._store.incr(self._key("probes"), -1)
+            if remaining is not None and remaining < 0:
+                self._store.delete(self._key("probes"))
+
+    def record_failure(self, reason):
+        self._store.set(self._key("last_error"), reason.encode("utf-8"), 24 * 3600)
+        failures = self._store.incr(self._key("failures"), 1, ttl=10 * self.recovery_timeout)
+        probing = self._store.get(self._key("tripped")) is not None
+        if probing or (failures is not None and failures >= self.failure_threshold):
+            self._store.set(self._key("tripped"), b"1", 24 * 3600)
+            self._store.set(self._key("open_until"), str(time.time() + self.recovery_timeout).encode(),
+                            self.recovery_timeout + 1)
+            self._store.delete(self._key("probes"))
+
+    def remember(self, key, data):
+        """Keep the last good response so an open circuit can serve it instead of failing"""
+        with self._lock:
+            self._stale[key] = (data, time.time())
+            self._stale.move_to_end(key)
+            while len(self._stale) > self.stale_entries:
+                self._stale.popitem(last=False)
+
+    def stale(self, key):
+        """Last good response marked with `stale` and its age in seconds, or None"""
+        with self._lock:
+            entry = self._stale.get(key)
+            if entry is None:
+                return None
+            self._stale_served += 1
+            data, stored_at = entry
+            return {**data, "stale": True, "stale_age_s": int(time.time() - stored_at)}
+
+    def snapshot(self):
+        def read(name, cast=int, default=0):
+            value = self._store.get(name)
+            return cast(value) if value is not None else default
+
+        last_error = self._store.get(self._key("last_error"))
+        with self._lock:
+            rejected, stale_served = self._rejected, self._stale_served
+        return {
+            "state": self.state(),
+            "consecutive_failures": read(self._key("failures")),
+            "calls_this_minute": read(self._minute_key(time.time())),
+            "per_minute_limit": self.per_minute,
+            "calls_this_month": read(self._month_key()),
+            "per_month_limit": self.per_month,
+            "rejected_calls (this process)": rejected,
+            "stale_responses_served (this process)": stale_served,
+            "last_error": last_error.decode("utf-8") if last_error is not None else None,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_openweather_quota():
+    """Quota manager over the shared store: one budget per process, or per deployment with Redis"""
+    return OpenWeatherQuota(get_kv_store())
+
+
+_call_context = threading.local()
+
+
+@contextmanager
+def paced_calls(deadline=None):
+    """Mark OpenWeather calls made by this thread as background work.
+
+    They wait for the background share of the budget (see acquire_paced) instead of
+    failing fast, and never read or fill the interactive last-good fallback.
+    """
+    previous = getattr(_call_context, "paced", None)
+    _call_context.paced = (deadline,)
+    try:
+        yield
+    finally:
+        _call_context.paced = previous
+
+
+def _openweather_get(url, params, timeout):
+    """requests.get guarded by the shared quota; raises OpenWeatherUnavailable on refusal/outage"""
+    quota = get_openweather_quota()
+    paced = getattr(_call_context, "paced", None)
+    refused = quota.acquire() if paced is None else quota.acquire_paced(paced[0])
+    if refused:
+        raise OpenWeatherUnavailable(refused)
+
+    settled = False
+    try:
+        try:
+            response = requests.get(url, params=params, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            quota.record_failure(f"Network error: {e}")
+            settled = True
+            raise OpenWeatherUnavailable(f"🌐 Network error: {str(e)}")
+
+        if response.status_code == 429:
+            quota.record_failure("HTTP 429")
+            settled = True
+            raise OpenWeatherUnavailable("⚠️ Rate limit exceeded. Wait 60 seconds before retrying.")
+        if response.status_code >= 500:
+            quota.record_failure(f"HTTP {response.status_code}")
+            settled = True
+            raise OpenWeatherUnavailable(f"🌐 OpenWeather server error ({response.status_code}). Try again later.")
+
+        quota.record_success()
+        settled = True
+        return response
+    finally:
+        if not settled:
+            quota.release()
+
+
+def _with_circuit_breaker(cache_key, fetch, *args):
+    """Run a cached fetch; on refusal serve the last good response or an error dict"""
+    quota = get_openweather_quota()
+    background = getattr(_call_context, "paced", None) is not None
+    try:
+        data = fetch(*args)
+    except OpenWeatherUnavailable as e:
+        stale = None if background else quota.stale(cache_key)
+        if stale is not None:
+            return stale
+        return {"error": str(e)}
+
+    if "error" not in data and not background:
+        quota.remember(cache_key, data)
+    return data
+
+
+# ========================================
+# 🔧 WEATHER API FUNCTIONS (FIXED)
+# ========================================
+
+@shared_cache(ttl=300)  # Cache for 5 minutes to respect rate limits
+def _fetch_weather_data(city: str, weather_api_key: str):
+    base_url = "https://api.openweathermap.org/data/2.5/weather"
+    params = {
+        "q": city,
+        "appid": weather_api_key,
+        "units": "metric"  # Returns temperature in Celsius directly
+    }
+    
+    try:
+        response = _openweather_get(base_url, params, timeout=10)
+        data = response.json()
+        
+        # Handle OpenWeather-specific error codes
+        if response.status_code == 401:
+            return {"error": "❌ Invalid API key. Verify in OpenWeather dashboard."}
+        elif response.status_code == 404:
+            return {"error": f"❌ City '{city}' not found. Try 'City,Country' format.", "status": 404}
+        elif data.get("cod") != 200:
+            return {"error": f"❌ API Error {data.get('cod')}: {data.get('message', 'Unknown')}"}
+        
+        return data
+    except OpenWeatherUnavailable:
+        raise
+    except Exception as e:
+        return {"error": f"💥 Unexpected error: {str(e)}"}
+
+
+def get_weather_data(city: str, weather_api_key: str):
+    """Fetch current weather data from OpenWeatherMap"""
+    return _with_circuit_breaker(("weather", city), _fetch_weather_data, city, weather_api_key)
+
+
+@shared_cache(ttl=300)
+def _fetch_weekly_forecast(weather_api_key: str, lat: float, lon: float):
+    base_url = "https://api.openweathermap.org/data/2.5/forecast"
+    params = {
+        "lat": lat,
+        "lon": lon,
+        "appid": weather_api_key,
+        "units": "metric",
+        "cnt": 40  # 5 days × 8 intervals/day
+    }
+    
+    try:
+        response = _openweather_get(base_url, params, timeout=15)
+        data = response.json()
+        
+        if response.status_code == 401:
+            return {"error": "❌ Invalid API key for forecast endpoint."}
+        elif data.get("cod") != "200":
+            return {"error": f"❌ Forecast Error: {data.get('message', 'Unknown')}"}
+        
+        return data
+    except OpenWeatherUnavailable:
+        raise
+    except Exception as e:
+        return {"error": f"💥 Forecast fetch error: {str(e)}"}
+
+
+def get_weekly_forecast(weather_api_key: str, lat: float, lon: float):
+    """Fetch 5-day/3-hour forecast from OpenWeatherMap"""
+    return _with_circuit_breaker(("forecast", lat, lon), _fetch_weekly_forecast, weather_api_key, lat, lon)
+
+
+@shared_cache(ttl=300)
+def _fetch_air_pollution_data(lat: float, lon: float, weather_api_key: str):
+    url = "https://api.openweathermap.org/data/2.5/air_pollution"
+    params = {
+        "lat": lat,
+        "lon": lon,
+        "appid": weather_api_key
+    }
+    
+    try:
+        response = _openweather_get(url, params, timeout=10)
+        data = response.json()
+        
+        if response.status_code == 401:
+            return {"error": "❌ Invalid API key for air pollution endpoint."}
+        elif data.get("cod") != "200":
+            return {"error": f"❌ Air Quality Error: {data.get('message', 'Unknown')}"}
+        
+        return data
+    except OpenWeatherUnavailable:
+        raise
+    except Exception as e:
+        return {"error": f"💥 Air quality fetch error: {str(e)}"}
+
+
+def get_air_pollution_data(lat: float, lon: float, weather_api_key: str):
+    """Fetch air pollution data from OpenWeatherMap"""
+    return _with_circuit_breaker(("air_pollution", lat, lon), _fetch_air_pollution_data, lat, lon, weather_api_key)
+
+
+# ========================================
+# 🤖 LLM FUNCTIONS
+# ========================================
+
+model_map = {
+    "chat": "ibm/granite-3-3-8b-instruct",
+    "traffic": "ibm/granite-3-3-8b-instruct",
+    "energy": "ibm/granite-3-3-8b-instruct",
+    "environment": "ibm/granite-3-3-8b-instruct",
+    "reports": "ibm/granite-3-3-8b-instruct"
+}
+
+def get_llm(model_name):
+    return WatsonxLLM(
+        model_id=model_map[model_name],
+        url=get_secret("WATSONX_URL"),
+        apikey=get_secret("WATSONX_APIKEY"),
+        project_id=get_secret("WATSONX_PROJECT_ID"),
+        params={
+            GenParams.DECODING_METHOD: "greedy",
+            GenParams.TEMPERATURE: 0.7,
+            GenParams.MIN_NEW_TOKENS: 5,
+            GenParams.MAX_NEW_TOKENS: 300,
+            GenParams.STOP_SEQUENCES: ["Human:", "Observation"],
+        },
+    )
+
+@shared_cache(ttl=900)
+def get_city_summary(city: str):
+    """Default AI overview of a city, cached so the profile prefetch can warm it"""
+    return get_llm("reports").invoke(
+        f"Give a short overview of current urban conditions in {city}, "
+        "covering weather, air quality, traffic and energy."
+    )
+
+
+# ========================================
+# 📈 CHART DOWNSAMPLING
+# ========================================
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the series' shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def downsample_series(df, x, columns, value_name, max_points):
+    """Long-format (x, Type, value) frame with each column reduced to max_points by LTTB"""
+    frames = []
+    for column in columns:
+        series = df[[x, column]].dropna().sort_values(x)
+        xs = pd.to_datetime(series[x]).astype("int64").to_numpy(dtype=float)
+        keep = lttb(xs, series[column].to_numpy(dtype=float), max_points)
+        frames.append(pd.DataFrame({x: series[x].to_numpy()[keep], "Type": column, value_name: series[column].to_numpy()[keep]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ========================================
+# 📄 PDF EXPORT FUNCTION
+# ========================================
+
+def export_city_report(profile_data, city_data):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, txt="SmartCityAI - City Analysis Report", ln=True, align='C')
+    pdf.ln(10)
+    
+    if profile_data:
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, txt="User Information", ln=True)
+        pdf.set_font("Arial", '', 12)
+        for key, value in profile_data.items():
+            pdf.cell(0, 10, txt=f"{key.capitalize()}: {value}", ln=True)
+    
+    pdf.ln(10)
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, txt="Recent City Metrics", ln=True)
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 10, txt=f"Avg Traffic Delay: {city_data.get('traffic_delay', 'N/A')} mins", ln=True)
+    pdf.cell(0, 10, txt=f"Avg CO2 Level: {city_data.get('co2_level', 'N/A')} ppm", ln=True)
+    pdf.cell(0, 10, txt=f"Energy Use: {city_data.get('energy_use', 'N/A')} kWh/day", ln=True)
+    pdf.cell(0, 10, txt=f"Waste Collected: {city_data.get('waste_ton', 'N/A')} tons", ln=True)
+    
+    pdf_output = pdf.output(dest='S').encode('latin-1')
+    return pdf_output
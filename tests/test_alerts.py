@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+import alerts
+from alerts import AQI_METRICS, AQI_RULES, AlertEngine, evaluate_rules
+from smartcity import InProcessStore
+
+
+def rule(kind, threshold, metric="m", window=None, name=None):
+    r = {"name": name or kind, "metric": metric, "kind": kind, "threshold": threshold, "unit": "", "severity": "info"}
+    if window is not None:
+        r["window"] = window
+    return r
+
+
+def hits(values, rules, **kwargs):
+    return [(r["name"], c, s, v) for r, c, s, v in evaluate_rules(np.array(values, dtype=float), ["m"], rules, **kwargs)]
+
+
+def test_level_rules_report_first_triggering_slot_per_city():
+    values = [[[1, 5, 7], [1, 2, 3]]]
+    assert hits(values, [rule("above", 4)]) == [("above", 0, 1, 5.0)]
+    assert hits(values, [rule("below", 2)]) == [("below", 0, 0, 1.0), ("below", 1, 0, 1.0)]
+
+
+def test_rate_rules_use_change_over_window():
+    values = [[[10, 12, 25, 11]]]
+    assert hits(values, [rule("rise", 10, window=1)]) == [("rise", 0, 2, 13.0)]
+    assert hits(values, [rule("fall", 10, window=1)]) == [("fall", 0, 3, -14.0)]
+    assert hits(values, [rule("rise", 10, window=2)]) == [("rise", 0, 2, 15.0)]
+    # A window as long as the series cannot be evaluated
+    assert hits(values, [rule("rise", 0, window=4)]) == []
+
+
+def test_nan_never_triggers():
+    values = [[[np.nan, np.nan], [np.nan, 50]]]
+    assert hits(values, [rule("above", 10)]) == [("above", 1, 1, 50.0)]
+    assert hits(values, [rule("rise", 0, window=1)]) == []
+
+
+def test_current_only_ignores_previous_slot_for_levels():
+    values = [[[9, 1], [1, 9]]]
+    assert hits(values, [rule("above", 5)], current_only=True) == [("above", 1, 1, 9.0)]
+    # Rate rules still compare with the previous slot
+    assert hits(values, [rule("fall", 5, window=1)], current_only=True) == [("fall", 0, 1, -8.0)]
+
+
+def test_aqi_rules_fire_on_current_reading_and_spikes():
+    # metric × city × (previous, current)
+    values = np.full((len(AQI_METRICS), 2, 2), np.nan)
+    values[:, 0] = [[5, 2], [10, 10], [5, 5]]  # air quality improved since last cycle
+    values[:, 1] = [[2, 4], [10, 40], [5, 5]]  # got worse, with a PM2.5 spike
+    triggered = {(r["name"], c) for r, c, _, _ in evaluate_rules(values, list(AQI_METRICS), AQI_RULES, current_only=True)}
+    assert triggered == {("Poor air quality", 1), ("PM2.5 spike", 1)}
+
+
+class FakeUpstream:
+    """Stands in for the OpenWeather fetchers: a 40-slot forecast starting at `start` and one AQI reading"""
+
+    def __init__(self, start=1_800_000_000):
+        self.start = start
+        self.temp_max = {}  # city -> temp_max for every slot
+        self.aqi = {}       # city -> (aqi, pm2_5)
+        self.lat, self.city_at = {}, {}
+
+    def weather(self, city, key):
+        lat = self.lat.setdefault(city, float(len(self.lat)))
+        self.city_at[lat] = city
+        return {"coord": {"lat": lat, "lon": 0.0}}
+
+    def forecast(self, key, lat, lon):
+        city = self.city_at[lat]
+        entries = [{"dt": self.start + i * 10800,
+                    "main": {"temp": 20.0, "temp_min": 10.0, "temp_max": self.temp_max.get(city, 25.0),
+                             "humidity": 50, "pressure": 1010},
+                    "wind": {"speed": 3.0}} for i in range(40)]
+        return {"list": entries}
+
+    def air(self, lat, lon, key):
+        aqi, pm2_5 = self.aqi.get(self.city_at[lat], (1, 5.0))
+        return {"list": [{"dt": self.start, "main": {"aqi": aqi}, "components": {"pm2_5": pm2_5, "no2": 5.0}}]}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    store = InProcessStore()
+    monkeypatch.setenv("OPENWEATHER_APIKEY", "test")
+    monkeypatch.setattr(alerts, "get_kv_store", lambda: store)
+    monkeypatch.setattr(alerts, "get_weather_data", fake.weather)
+    monkeypatch.setattr(alerts, "get_weekly_forecast", fake.forecast)
+    monkeypatch.setattr(alerts, "get_air_pollution_data", fake.air)
+    return fake
+
+
+def names(new_alerts):
+    return sorted((a["city"], a["rule"]) for a in new_alerts)
+
+
+def test_ongoing_event_alerts_once_until_it_clears(upstream):
+    engine = AlertEngine(interval=60)
+    engine.set_watchlist(["Rome"])
+    upstream.temp_max["Rome"] = 38.0
+    upstream.aqi["Rome"] = (4, 5.0)
+    assert names(engine.run_cycle()) == [("Rome", "Heatwave"), ("Rome", "Poor air quality")]
+
+    # The forecast window and AQI timestamp move on while both conditions persist
+    for _ in range(3):
+        upstream.start += 10800
+        assert engine.run_cycle() == []
+
+    upstream.temp_max["Rome"] = 25.0
+    upstream.aqi["Rome"] = (1, 5.0)
+    assert engine.run_cycle() == []
+    upstream.temp_max["Rome"] = 38.0
+    assert names(engine.run_cycle()) == [("Rome", "Heatwave")]
+    assert len(engine.feed()) == 3
+
+
+def test_ad_hoc_cities_keep_watchlist_state(upstream):
+    engine = AlertEngine(interval=60)
+    engine.set_watchlist(["Rome", "Oslo"])
+    engine.run_cycle()
+    store = alerts.get_kv_store()
+    cursor = store.get("alerts:cursor")
+
+    engine.run_cycle(["Lima"])
+    assert sorted(engine._load("last_aqi", {})) == ["Oslo", "Rome"]
+    assert sorted(engine._load("last_good", {})) == ["Oslo", "Rome"]
+    assert store.get("alerts:cursor") == cursor
+
+    # The previous AQI reading survived, so a spike is still detected
+    upstream.aqi["Rome"] = (1, 60.0)
+    assert names(engine.run_cycle()) == [("Rome", "PM2.5 spike")]
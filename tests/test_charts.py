@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from smartcity import downsample_series, lttb
+
+
+def test_lttb_returns_everything_when_under_threshold():
+    x = np.arange(10, dtype=float)
+    assert lttb(x, x, 10).tolist() == list(range(10))
+    assert lttb(x, x, 2).tolist() == list(range(10))
+
+
+def test_lttb_keeps_endpoints_and_order():
+    x = np.arange(1000, dtype=float)
+    keep = lttb(x, np.sin(x / 50), 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[[137, 512, 873]] = [50.0, -40.0, 30.0]
+    keep = set(lttb(x, y, 50).tolist())
+    assert {137, 512, 873} <= keep
+
+
+def test_downsample_series_long_format_per_column():
+    times = pd.date_range("2026-01-01", periods=500, freq="h")
+    df = pd.DataFrame({"Time": times, "Max": np.arange(500.0), "Min": np.arange(500.0) - 5})
+    df.loc[10, "Min"] = np.nan
+    out = downsample_series(df, "Time", ["Max", "Min"], "Temperature", 60)
+    assert list(out.columns) == ["Time", "Type", "Temperature"]
+    assert out.groupby("Type").size().to_dict() == {"Max": 60, "Min": 60}
+    assert out["Temperature"].notna().all()
+    max_rows = out[out["Type"] == "Max"]
+    assert max_rows["Time"].iloc[0] == times[0] and max_rows["Time"].iloc[-1] == times[-1]
+
+
+def test_downsample_series_short_input_is_unchanged():
+    df = pd.DataFrame({"Time": pd.date_range("2026-01-01", periods=5, freq="D"), "AQI": [1, 2, 3, 2, 1]})
+    out = downsample_series(df, "Time", ["AQI"], "Value", 350)
+    assert out["Value"].tolist() == [1, 2, 3, 2, 1]
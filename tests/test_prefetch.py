@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import prefetch
+from prefetch import PrefetchJob, Prefetcher
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+    gate = threading.Event()
+    gate.set()
+
+    def weather(city, key):
+        calls.append("weather")
+        return {"error": "❌ City not found", "status": 404} if city == "Atlantis" else {"coord": {"lat": 1.0, "lon": 2.0}}
+
+    def forecast(key, lat, lon):
+        calls.append("forecast")
+        return {"list": []}
+
+    def air(lat, lon, key):
+        calls.append("air_pollution")
+        return {"list": []}
+
+    def summary(city):
+        gate.wait(5)
+        calls.append("summary")
+        return f"All calm in {city}."
+
+    monkeypatch.setattr(prefetch, "get_weather_data", weather)
+    monkeypatch.setattr(prefetch, "get_weekly_forecast", forecast)
+    monkeypatch.setattr(prefetch, "get_air_pollution_data", air)
+    monkeypatch.setattr(prefetch, "get_city_summary", summary)
+    return calls, gate
+
+
+def test_warmed_stages_count_as_hits_once(upstream):
+    prefetcher = Prefetcher(max_workers=1)
+    job = prefetcher.start("Rome", "key")
+    job.future.result(5)
+    assert job.status == "done"
+    assert upstream[0] == ["weather", "forecast", "air_pollution", "summary"]
+
+    assert prefetcher.record_lookup(job, " rome ", "weather")
+    assert prefetcher.record_lookup(job, "Rome", "summary")
+    # Repeat lookups of a stage are not counted again
+    assert prefetcher.record_lookup(job, "Rome", "weather")
+    assert prefetcher.snapshot()["hits"] == 2 and prefetcher.snapshot()["misses"] == 0
+
+
+def test_other_city_unready_stage_and_errors_are_misses(upstream):
+    _, gate = upstream
+    gate.clear()
+    prefetcher = Prefetcher(max_workers=1)
+    job = prefetcher.start("Rome", "key")
+    assert not prefetcher.record_lookup(job, "Oslo", "weather")
+    assert not prefetcher.record_lookup(None, "Rome", "weather")
+    assert not prefetcher.record_lookup(job, "Rome", "summary")
+    gate.set()
+    job.future.result(5)
+
+    failed = prefetcher.start("Atlantis", "key")
+    failed.future.result(5)
+    assert not prefetcher.record_lookup(failed, "Atlantis", "weather")
+    assert prefetcher.snapshot()["misses"] == 4
+
+
+def test_cancel_counts_once_and_skips_remaining_stages(upstream):
+    calls, gate = upstream
+    gate.clear()
+    prefetcher = Prefetcher(max_workers=1)
+    job = prefetcher.start("Rome", "key")
+    queued = prefetcher.start("Oslo", "key")
+
+    prefetcher.cancel(queued)
+    prefetcher.cancel(queued)
+    assert queued.status == "cancelled"
+    prefetcher.cancel(job)
+    prefetcher.cancel(job)
+    gate.set()
+    job.future.result(5)
+
+    assert job.status == "cancelled"
+    assert prefetcher.snapshot()["prefetches_cancelled"] == 2
+    # The queued job never ran; the running one finished its in-flight stage only
+    assert calls.count("weather") == 1
+
+
+def test_finished_job_cannot_be_cancelled():
+    job = PrefetchJob("Rome")
+    job.status = "done"
+    assert job.cancel() is False
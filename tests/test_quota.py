@@ -0,0 +1,109 @@
+import pytest
+
+import smartcity
+from smartcity import InProcessStore, OpenWeatherQuota
+
+
+class Clock:
+    def __init__(self, now=1_000_020.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(smartcity.time, "time", clock)
+    monkeypatch.setattr(smartcity.time, "sleep", lambda seconds: setattr(clock, "now", clock.now + seconds))
+    return clock
+
+
+def make_quota(store=None, **kwargs):
+    return OpenWeatherQuota(store if store is not None else InProcessStore(), **kwargs)
+
+
+def trip(quota):
+    for _ in range(quota.failure_threshold):
+        quota.record_failure("boom")
+
+
+def test_breaker_opens_after_threshold_and_refuses(clock):
+    quota = make_quota(failure_threshold=3)
+    quota.record_failure("boom")
+    quota.record_failure("boom")
+    assert quota.state() == "closed"
+    quota.record_failure("boom")
+    assert quota.state() == "open"
+    assert "circuit open" in quota.acquire()
+    assert quota.snapshot()["last_error"] == "boom"
+
+
+def test_half_open_allows_one_probe_and_closes_on_success(clock):
+    quota = make_quota(recovery_timeout=30)
+    trip(quota)
+    clock.now += 31
+    assert quota.state() == "half_open"
+    assert quota.acquire() is None
+    assert "probe in progress" in quota.acquire()
+    quota.record_success()
+    assert quota.state() == "closed"
+    assert quota.acquire() is None
+
+
+def test_failed_probe_reopens(clock):
+    quota = make_quota(recovery_timeout=30)
+    trip(quota)
+    clock.now += 31
+    assert quota.acquire() is None
+    quota.record_failure("still down")
+    assert quota.state() == "open"
+
+
+def test_release_frees_probe_slot(clock):
+    quota = make_quota(recovery_timeout=30)
+    trip(quota)
+    clock.now += 31
+    assert quota.acquire() is None
+    quota.release()
+    assert quota.acquire() is None
+
+
+def test_per_minute_limit_resets_next_minute(clock):
+    quota = make_quota(per_minute=3)
+    assert [quota.acquire() for _ in range(3)] == [None, None, None]
+    assert "Per-minute budget" in quota.acquire()
+    clock.now += 60
+    assert quota.acquire() is None
+
+
+def test_paced_acquire_leaves_interactive_reserve_and_waits(clock):
+    quota = make_quota(per_minute=5, interactive_reserve=2)
+    start = clock.now
+    for _ in range(3):
+        assert quota.acquire_paced() is None
+    assert clock.now == start
+    # The reserve is still there for interactive callers
+    assert quota.acquire() is None
+    assert quota.acquire() is None
+    # The next background call sleeps into the following minute instead of failing
+    assert quota.acquire_paced() is None
+    assert clock.now > start and int(clock.now // 60) == int(start // 60) + 1
+
+
+def test_paced_acquire_gives_up_at_deadline(clock):
+    quota = make_quota(per_minute=3, interactive_reserve=2)
+    assert quota.acquire_paced() is None
+    assert "Per-minute budget" in quota.acquire_paced(deadline=clock.now + 5)
+    assert quota.snapshot()["rejected_calls (this process)"] == 1
+
+
+def test_state_is_shared_through_the_store(clock):
+    store = InProcessStore()
+    first, second = make_quota(store, per_minute=2), make_quota(store, per_minute=2)
+    assert first.acquire() is None
+    assert second.acquire() is None
+    assert first.acquire() is not None
+    trip(first)
+    assert second.state() == "open"
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import service
+
+WEATHER = {"coord": {"lat": 41.9, "lon": 12.5}, "main": {"temp": 20.0}}
+
+
+class FakeEngine:
+    def start(self):
+        pass
+
+    def snapshot(self):
+        return {"interval_s": 900}
+
+    def feed(self, limit=100):
+        return [{"city": "Rome", "rule": "Heatwave"}, {"city": "Oslo", "rule": "Freezing"}][:limit]
+
+
+@pytest.fixture
+def call(monkeypatch):
+    monkeypatch.setenv("OPENWEATHER_APIKEY", "test")
+    monkeypatch.setattr(service, "get_alert_engine", FakeEngine)
+
+    def weather(city, key):
+        if city == "Atlantis":
+            return {"error": "❌ City not found", "status": 404}
+        if city == "Down":
+            return {"error": "⛔ OpenWeather unavailable (circuit open)."}
+        return WEATHER
+
+    monkeypatch.setattr(service, "get_weather_data", weather)
+    monkeypatch.setattr(service, "get_weekly_forecast",
+                        lambda key, lat, lon: {"list": [], "stale": True, "stale_age_s": 120})
+    monkeypatch.setattr(service, "get_air_pollution_data", lambda lat, lon, key: {"list": []})
+
+    def call(method, path, **kwargs):
+        async def run():
+            async with TestClient(TestServer(service.build_app())) as client:
+                response = await client.request(method, path, **kwargs)
+                body = await response.read()
+                return response.status, response.headers, body
+        return asyncio.run(run())
+
+    return call
+
+
+def test_unknown_city_is_404(call):
+    status, _, _ = call("GET", "/weather?city=Atlantis")
+    assert status == 404
+    status, _, _ = call("GET", "/city?city=Atlantis")
+    assert status == 404
+
+
+def test_upstream_failure_is_502(call):
+    status, _, _ = call("GET", "/weather?city=Down")
+    assert status == 502
+
+
+@pytest.mark.parametrize("method, path, kwargs", [
+    ("GET", "/weather", {}),
+    ("GET", "/forecast", {}),
+    ("GET", "/forecast?lat=north&lon=1", {}),
+    ("GET", "/city?city=Rome&include=traffic", {}),
+    ("GET", "/alerts?limit=ten", {}),
+    ("POST", "/llm/nope", {"json": {"prompt": "hi"}}),
+    ("POST", "/llm/chat", {"data": "{not json"}),
+    ("POST", "/llm/chat", {"json": ["a list"]}),
+    ("POST", "/report", {"data": "{not json"}),
+    ("POST", "/report", {"json": {"profile": [1, 2]}}),
+    ("POST", "/report", {"json": {"city_data": "x"}}),
+])
+def test_client_errors_are_400(call, method, path, kwargs):
+    status, _, _ = call(method, path, **kwargs)
+    assert status == 400
+
+
+def test_report_rejects_text_the_pdf_font_cannot_encode(call):
+    status, _, _ = call("POST", "/report", json={"profile": {"name": "Ana 😀"}})
+    assert status == 422
+
+
+def test_report_returns_pdf(call):
+    status, headers, body = call("POST", "/report", json={"profile": {"name": "Ana"}, "city_data": {"co2_level": 410}})
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert body.startswith(b"%PDF")
+
+
+def test_stale_sections_set_headers(call):
+    status, headers, _ = call("GET", "/forecast?city=Rome")
+    assert status == 200
+    assert headers["X-Data-Stale"] == "true" and headers["X-Data-Age"] == "120"
+
+    status, headers, _ = call("GET", "/city?city=Rome&include=weather,forecast")
+    assert status == 200 and headers["X-Data-Stale"] == "true"
+
+    status, headers, _ = call("GET", "/air-quality?lat=1&lon=2")
+    assert status == 200 and "X-Data-Stale" not in headers
+
+
+def test_health_and_alerts(call):
+    status, _, _ = call("GET", "/health")
+    assert status == 200
+    status, _, body = call("GET", "/alerts?limit=1")
+    assert status == 200 and b"Heatwave" in body and b"Freezing" not in body
@@ -0,0 +1,116 @@
+import pytest
+
+import smartcity
+from smartcity import InProcessStore, LocalRedisStandIn, RedisStore, decode_value, encode_value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(smartcity.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("value", [
+    {"city": "Zürich", "temp": 21.5, "tags": ["a", "b"], "none": None},
+    [1, 2, 3],
+    "plain",
+    {"list": [{"dt": i, "main": {"temp": 20.0 + i}} for i in range(100)]},
+])
+def test_encode_round_trip(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_encode_compresses_large_values_only():
+    small, large = {"a": 1}, {"list": [{"main": {"temp": 20.0}}] * 200}
+    assert encode_value(small) == b'r{"a":1}'
+    blob = encode_value(large)
+    assert blob[:1] == b"z"
+    assert len(blob) < len(encode_value(small)) + 100
+    assert decode_value(blob) == large
+
+
+def test_in_process_ttl(clock):
+    store = InProcessStore()
+    store.set("k", b"v", ttl=10)
+    store.set("forever", b"v")
+    clock[0] += 9
+    assert store.get("k") == b"v"
+    clock[0] += 2
+    assert store.get("k") is None
+    assert store.get("forever") == b"v"
+
+
+def test_in_process_evicts_least_recently_used():
+    store = InProcessStore(max_entries=3)
+    for key in "abc":
+        store.set(key, b"1")
+    store.get("a")
+    store.set("d", b"1")
+    assert store.get("b") is None
+    assert [store.get(key) for key in "acd"] == [b"1", b"1", b"1"]
+
+
+def test_in_process_sweeps_expired_keys(clock):
+    store = InProcessStore(sweep_every=4)
+    for i in range(3):
+        store.set(f"old{i}", b"1", ttl=1)
+    clock[0] += 5
+    store.set("new", b"1")
+    assert len(store) == 1
+
+
+def test_add_and_incr(clock):
+    store = InProcessStore()
+    assert store.add("lock", b"me", ttl=5)
+    assert not store.add("lock", b"you", ttl=5)
+    assert store.get("lock") == b"me"
+
+    assert store.incr("n", 1, ttl=10) == 1
+    assert store.incr("n", 2) == 3
+    assert store.incr("n", -1) == 2
+    # The ttl from creation is kept by later increments
+    clock[0] += 11
+    assert store.get("n") is None
+
+
+class BrokenClient:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("redis is down")
+        return fail
+
+
+def test_redis_store_treats_client_errors_as_misses():
+    store = RedisStore(BrokenClient(), errors=(ConnectionError,))
+    assert store.get("k") is None
+    store.set("k", b"v", ttl=5)
+    assert store.add("k", b"v") is False
+    assert store.incr("n") is None
+    store.delete("k")
+    assert store.errors == 5
+
+
+def test_redis_store_over_stand_in():
+    store = RedisStore(LocalRedisStandIn())
+    assert store.add("k", b"v", ttl=5)
+    assert not store.add("k", b"w", ttl=5)
+    assert store.get("k") == b"v"
+    assert store.incr("n", 2, ttl=5) == 2
+    store.delete("k")
+    assert store.get("k") is None
+
+
+def test_redis_client_uses_short_timeouts(monkeypatch):
+    redis = pytest.importorskip("redis")
+    monkeypatch.setenv("SHARED_STATE_URL", "redis://127.0.0.1:6399/0")
+    smartcity.get_kv_store.cache_clear()
+    try:
+        store = smartcity.get_kv_store()
+        kwargs = store._client.connection_pool.connection_kwargs
+        assert kwargs["socket_connect_timeout"] == smartcity.REDIS_TIMEOUT
+        assert kwargs["socket_timeout"] == smartcity.REDIS_TIMEOUT
+        # A timeout is handled like any other client error: counted, treated as a miss
+        assert issubclass(redis.TimeoutError, store._errors)
+    finally:
+        smartcity.get_kv_store.cache_clear()